@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, UserProfile
+from .models import User, UserProfile, OutboxEmail
 from django.contrib.auth.admin import UserAdmin
 
 # Register your models here.
@@ -12,6 +12,12 @@ class CustomUserAdmin(UserAdmin):
     fieldsets = ()
 
 
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to_email', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    readonly_fields = ('context', 'last_error')
+
 
 admin.site.register(User, CustomUserAdmin)
-admin.site.register(UserProfile)
\ No newline at end of file
+admin.site.register(UserProfile)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
\ No newline at end of file
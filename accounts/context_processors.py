@@ -1,23 +1,67 @@
-from urllib.parse import uses_relative
-from accounts.models import UserProfile
-from vendor.models import Vendor
 from django.conf import settings
+from django.db import connection
+from django.utils.functional import SimpleLazyObject, new_method_proxy
+
+from accounts.models import User, UserProfile
+from vendor.models import Vendor
+
+
+class LazyContextValue(SimpleLazyObject):
+    # Numbers are localized with format()
+    __format__ = new_method_proxy(format)
+
+
+def request_memo(request, name, fetch):
+    """``fetch()``, run at most once per request and shared by all context processors"""
+    memo = request.__dict__.setdefault('_context_memo', {})
+    if name not in memo:
+        memo[name] = fetch()
+    return memo[name]
+
+
+def lazy_context(request, name, fetch):
+    """
+    A template value that runs ``fetch()`` on first access only. The queries
+    each value ran, or None for values never used, are kept for
+    dishonline_main.middleware.QueryCountMiddleware.
+    """
+    report = request.__dict__.setdefault('_lazy_context', {})
+    report.setdefault(name, None)
+
+    def evaluate():
+        start = len(connection.queries)
+        value = fetch()
+        report[name] = (report[name] or 0) + len(connection.queries) - start
+        return value
+    return LazyContextValue(evaluate)
+
+
+def fetch_vendor(request):
+    def fetch():
+        if not request.user.is_authenticated or request.user.role != User.VENDOR:
+            return None
+        return Vendor.objects.select_related('user_profile').filter(user=request.user).first()
+    return request_memo(request, 'vendor', fetch)
+
+
+def fetch_user_profile(request):
+    def fetch():
+        if not request.user.is_authenticated:
+            return None
+        # A vendor page has already loaded the profile with the vendor
+        vendor = request._context_memo.get('vendor')
+        if vendor is not None:
+            return vendor.user_profile
+        return UserProfile.objects.filter(user=request.user).first()
+    return request_memo(request, 'user_profile', fetch)
+
 
 def get_vendor(request):
-    try:
-        vendor = Vendor.objects.get(user=request.user)
-    except:
-        vendor = None
-    return dict(vendor=vendor)
+    return dict(vendor=lazy_context(request, 'vendor', lambda: fetch_vendor(request)))
 
 
 def get_user_profile(request):
-    try:
-        user_profile = UserProfile.objects.get(user=request.user)
-    except:
-        user_profile = None
-    return dict(user_profile=user_profile)
-
+    return dict(user_profile=lazy_context(request, 'user_profile', lambda: fetch_user_profile(request)))
 
 
 def get_locationiq_token(request):
@@ -25,4 +69,4 @@ def get_locationiq_token(request):
 
 
 def get_stripe_key(request):
-    return {'STRIPE_PUBLIC_KEY': settings.STRIPE_PUBLIC_KEY}
\ No newline at end of file
+    return {'STRIPE_PUBLIC_KEY': settings.STRIPE_PUBLIC_KEY}
@@ -4,6 +4,7 @@ from django.db.models.fields.related import ForeignKey, OneToOneField
 
 from django.contrib.gis.db import models as gismodels
 from django.contrib.gis.geos import Point
+from django.utils import timezone
 
 # Create your models here.
 class UserManager(BaseUserManager):
@@ -116,3 +117,31 @@ class UserProfile(models.Model):
         return super(UserProfile, self).save(*args, **kwargs)
 
 
+class OutboxEmail(models.Model):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    STATUS_CHOICE = (
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+    subject = models.CharField(max_length=255)
+    template = models.CharField(max_length=255)
+    context = models.JSONField(blank=True, default=dict)
+    to_email = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICE, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='accounts_outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} ({self.status})'
@@ -6,6 +6,11 @@ from django.utils.encoding import force_bytes
 from django.contrib.auth.tokens import default_token_generator
 from django.core.mail import EmailMessage, message
 from django.conf import settings
+from django.apps import apps
+from django.db import models
+from django.db.models.query import QuerySet
+
+from .models import OutboxEmail
 
 def detectUser(user):
     if user.role == 1:
@@ -20,28 +25,69 @@ def detectUser(user):
 
     
 def send_verification_email(request, user, mail_subject, email_template):
-    from_email = settings.DEFAULT_FROM_EMAIL
-    current_site = get_current_site(request)
-    message = render_to_string(email_template, {
+    context = {
         'user': user,
-        'domain': current_site,
+        'domain': get_current_site(request),
         'uid': urlsafe_base64_encode(force_bytes(user.pk)),
         'token': default_token_generator.make_token(user),
-    })
-    to_email = user.email
-    mail = EmailMessage(mail_subject, message, from_email, to=[to_email])
-    mail.content_subtype = "html"
-    mail.send()
+        'to_email': user.email,
+    }
+    send_notification(mail_subject, email_template, context)
 
 
 def send_notification(mail_subject, mail_template, context):
-    from_email = settings.DEFAULT_FROM_EMAIL
-    message = render_to_string(mail_template, context)
+    """
+    Queue an email in the outbox. It is written in the caller's transaction
+    and rendered and sent later by the ``send_queued_emails`` command.
+    """
     if(isinstance(context['to_email'], str)):
         to_email = []
         to_email.append(context['to_email'])
     else:
-        to_email = context['to_email']
-    mail = EmailMessage(mail_subject, message, from_email, to=to_email)
+        to_email = list(context['to_email'])
+    OutboxEmail.objects.create(
+        subject=mail_subject,
+        template=mail_template,
+        context=serialize_email_context(context),
+        to_email=to_email,
+    )
+
+
+def serialize_email_context(value):
+    # Model instances and querysets are stored as references and loaded
+    # again when the email is rendered; anything else is kept as plain JSON.
+    if isinstance(value, models.Model):
+        return {'__model__': value._meta.label_lower, 'pk': value.pk}
+    if isinstance(value, QuerySet):
+        return {'__queryset__': value.model._meta.label_lower, 'pks': [obj.pk for obj in value]}
+    if isinstance(value, dict):
+        return {str(key): serialize_email_context(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [serialize_email_context(val) for val in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def deserialize_email_context(value):
+    if isinstance(value, dict):
+        if '__model__' in value:
+            model = apps.get_model(value['__model__'])
+            return model._default_manager.get(pk=value['pk'])
+        if '__queryset__' in value:
+            model = apps.get_model(value['__queryset__'])
+            objects = model._default_manager.in_bulk(value['pks'])
+            return [objects[pk] for pk in value['pks'] if pk in objects]
+        return {key: deserialize_email_context(val) for key, val in value.items()}
+    if isinstance(value, list):
+        return [deserialize_email_context(val) for val in value]
+    return value
+
+
+def build_outbox_message(outbox_email, connection=None):
+    from_email = settings.DEFAULT_FROM_EMAIL
+    context = deserialize_email_context(outbox_email.context)
+    message = render_to_string(outbox_email.template, context)
+    mail = EmailMessage(outbox_email.subject, message, from_email, to=outbox_email.to_email, connection=connection)
     mail.content_subtype = "html"
-    mail.send()
+    return mail
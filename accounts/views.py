@@ -15,7 +15,10 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.exceptions import PermissionDenied
 from vendor.models import Vendor
 from django.template.defaultfilters import slugify
-from orders.models import Order
+from orders.models import VendorMonthlyRevenue
+from orders.history import customer_order_history, paginate_order_history, vendor_order_history, vendor_orders
+from django.db.models import Sum
+from django.utils import timezone
 import datetime
 
 
@@ -176,10 +179,9 @@ def myAccount(request):
 @login_required(login_url='login')
 @user_passes_test(check_role_customer)
 def custDashboard(request):
-    orders = Order.objects.filter(user=request.user, is_ordered=True)
-    recent_orders = orders[:5]
+    orders = customer_order_history(request.user)
+    recent_orders = paginate_order_history(orders, page_size=5).orders
     context = {
-        'orders': orders,
         'orders_count': orders.count(),
         'recent_orders': recent_orders,
     }
@@ -190,24 +192,20 @@ def custDashboard(request):
 @user_passes_test(check_role_vendor)
 def vendorDashboard(request):
     vendor = Vendor.objects.get(user=request.user)
-    orders = Order.objects.filter(vendors__in=[vendor.id], is_ordered=True).order_by('created_at')
-    recent_orders = orders[:10]
+    recent_orders = vendor_orders(paginate_order_history(vendor_order_history(vendor), page_size=10).orders)
+
+    # Totals come from the monthly revenue rollups, one row per month
+    monthly_revenue = VendorMonthlyRevenue.objects.filter(vendor=vendor)
+    totals = monthly_revenue.aggregate(revenue=Sum('revenue'), orders_count=Sum('order_count'))
 
     # current month's revenue
-    current_month = datetime.datetime.now().month
-    current_month_orders = orders.filter(vendors__in=[vendor.id], created_at__month=current_month)
-    current_month_revenue = 0
-    for i in current_month_orders:
-        current_month_revenue += i.get_total_by_vendor()['grand_total']
-    
+    current_month = timezone.localdate().replace(day=1)
+    current_month_revenue = monthly_revenue.filter(month=current_month).values_list('revenue', flat=True).first() or 0
 
     # total revenue
-    total_revenue = 0
-    for i in orders:
-        total_revenue += i.get_total_by_vendor()['grand_total']
+    total_revenue = totals['revenue'] or 0
     context = {
-        'orders': orders,
-        'orders_count': orders.count(),
+        'orders_count': totals['orders_count'] or 0,
         'recent_orders': recent_orders,
         'total_revenue': total_revenue,
         'current_month_revenue': current_month_revenue,
@@ -3,8 +3,8 @@ from django.contrib.auth.decorators import login_required
 from accounts.forms import UserInfoForm, UserProfileForm
 from accounts.models import UserProfile
 from django.contrib import messages
-from orders.models import Order, OrderedFood
-import simplejson as json
+from orders.models import Order, OrderReceipt
+from orders.history import customer_order_history, filter_order_history, next_page_query, paginate_order_history
 
 
 @login_required(login_url='login')
@@ -34,35 +34,27 @@ def cprofile(request):
 
 
 def my_orders(request):
-    orders = Order.objects.filter(user=request.user, is_ordered=True).order_by('-created_at')
+    orders = filter_order_history(customer_order_history(request.user), request.GET)
+    page = paginate_order_history(orders, request.GET.get('cursor'))
 
     context = {
-        'orders': orders,
+        'orders': page.orders,
+        'next_page': next_page_query(request, page),
+        'status_choices': Order.STATUS,
     }
     return render(request, 'customers/my_orders.html', context)
 
 
 def order_detail(request, order_number):
     try:
-        order = Order.objects.get(order_number=order_number, is_ordered=True)
-        ordered_food = OrderedFood.objects.filter(order=order)
-        subtotal = 0
-        for item in ordered_food:
-            subtotal += (item.price * item.quantity)
-
-        # Handle tax_data safely
-        tax_data = {}
-        if order.tax_data:
-            try:
-                tax_data = json.loads(order.tax_data)
-            except (json.JSONDecodeError, TypeError):
-                tax_data = {}
-
+        order = Order.objects.select_related('receipt').get(order_number=order_number, is_ordered=True)
+        receipt = OrderReceipt.for_order(order)
         context = {
             'order': order,
-            'ordered_food': ordered_food,
-            'subtotal': subtotal,
-            'tax_data': tax_data,
+            'transaction_id': receipt.data['transaction_id'],
+            'ordered_food': receipt.data['items'],
+            'subtotal': receipt.data['subtotal'],
+            'tax_data': receipt.data['tax_data'],
         }
         return render(request, 'customers/order_detail.html', context)
     except Order.DoesNotExist:
@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dishonline_main.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after the app registry is ready
+from orders.events import VENDOR_EVENTS_PATH, vendor_events_app
+
+
+async def application(scope, receive, send):
+    # Long-lived vendor event streams are served outside of the Django
+    # request cycle so that idle connections only cost an asyncio task.
+    if scope['type'] == 'http' and scope['path'] == VENDOR_EVENTS_PATH:
+        return await vendor_events_app(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,59 @@
+"""
+Django Management Command that rebuilds the vendor revenue rollups
+from the finalized orders.
+
+Usage:
+    python manage.py backfill_vendor_revenue
+    python manage.py backfill_vendor_revenue --vendor 12  # Only one vendor
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+
+from orders.models import OrderVendorTotal, VendorDailyRevenue, VendorMonthlyRevenue
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily and monthly vendor revenue rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', type=int, help='Only rebuild the rollups of this vendor id')
+
+    def handle(self, *args, **options):
+        vendor_totals = OrderVendorTotal.objects.filter(order__is_ordered=True)
+        daily = VendorDailyRevenue.objects.all()
+        monthly = VendorMonthlyRevenue.objects.all()
+        if options['vendor']:
+            vendor_totals = vendor_totals.filter(vendor_id=options['vendor'])
+            daily = daily.filter(vendor_id=options['vendor'])
+            monthly = monthly.filter(vendor_id=options['vendor'])
+
+        with transaction.atomic():
+            daily.delete()
+            monthly.delete()
+
+            rows = (
+                vendor_totals
+                .annotate(period=TruncDate('order__created_at'))
+                .values('vendor_id', 'period')
+                .annotate(revenue=Sum('grand_total'), order_count=Count('order_id', distinct=True))
+            )
+            VendorDailyRevenue.objects.bulk_create([
+                VendorDailyRevenue(vendor_id=row['vendor_id'], date=row['period'], revenue=row['revenue'], order_count=row['order_count'])
+                for row in rows
+            ], batch_size=1000)
+
+            rows = (
+                vendor_totals
+                .annotate(period=TruncMonth('order__created_at'))
+                .values('vendor_id', 'period')
+                .annotate(revenue=Sum('grand_total'), order_count=Count('order_id', distinct=True))
+            )
+            VendorMonthlyRevenue.objects.bulk_create([
+                VendorMonthlyRevenue(vendor_id=row['vendor_id'], month=row['period'].date(), revenue=row['revenue'], order_count=row['order_count'])
+                for row in rows
+            ], batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS('✅ Vendor revenue rollups rebuilt'))
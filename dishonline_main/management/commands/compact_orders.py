@@ -0,0 +1,96 @@
+"""
+Django Management Command that removes abandoned checkouts: cancelled
+orders that were never paid (is_ordered=False) and cart rows nobody
+touched for a long time.
+
+An unpaid order is only deleted once it is cancelled: by the gateway's
+fail or cancel callback, or by ``manage.py reconcile_payments`` after the
+gateway confirmed it unpaid. An order whose payment callback was lost
+stays until reconcile_payments has finalized or cancelled it.
+
+Rows are deleted in small batches, each in its own short transaction, so
+the job never holds long locks on the order and cart tables. Deleting an
+order also removes its vendor links (the M2M through rows) and vendor
+totals. With --archive the orders are first appended to an NDJSON file
+(gzip-compressed when the name ends in .gz).
+
+Usage:
+    python manage.py compact_orders
+    python manage.py compact_orders --order-hours 72 --cart-days 30 --batch-size 1000
+    python manage.py compact_orders --archive /backups/abandoned_orders.ndjson.gz
+    python manage.py compact_orders --dry-run  # Only count the rows
+"""
+
+import gzip
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+import simplejson as json
+
+from marketplace.models import Cart
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Deletes cancelled unpaid orders and stale cart rows in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--order-hours', type=int, default=72, help='Delete cancelled unpaid orders older than this many hours')
+        parser.add_argument('--cart-days', type=int, default=30, help='Delete cart rows not updated for this many days')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per transaction')
+        parser.add_argument('--sleep', type=float, default=0.1, help='Seconds to pause between batches')
+        parser.add_argument('--archive', help='Append the deleted orders to this NDJSON file first')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be deleted')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        # Served by orders_history_idx (is_ordered, created_at, id)
+        orders = Order.objects.filter(
+            is_ordered=False, status='Cancelled', created_at__lt=now - timedelta(hours=options['order_hours']),
+        )
+        carts = Cart.objects.filter(updated_at__lt=now - timedelta(days=options['cart_days']))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'✅ Dry run: {orders.count()} cancelled orders and {carts.count()} stale cart rows'))
+            return
+
+        archive = None
+        if options['archive']:
+            opener = gzip.open if options['archive'].endswith('.gz') else open
+            archive = opener(options['archive'], 'at', encoding='utf-8')
+        try:
+            deleted_orders = self.delete_in_batches(orders.order_by('created_at', 'id'), options, archive)
+        finally:
+            if archive:
+                archive.close()
+        deleted_carts = self.delete_in_batches(carts.order_by('id'), options)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Deleted {deleted_orders} cancelled orders and {deleted_carts} stale cart rows'))
+
+    def delete_in_batches(self, queryset, options, archive=None):
+        total = 0
+        while True:
+            with transaction.atomic():
+                # Lock the rows, so a late payment callback cannot finalize one being deleted
+                ids = list(queryset.select_for_update(skip_locked=True).values_list('id', flat=True)[:options['batch_size']])
+                if not ids:
+                    return total
+                if archive:
+                    self.archive_orders(ids, archive)
+                # Related rows (vendor links, vendor totals) are removed by the same delete
+                queryset.model.objects.filter(id__in=ids).delete()
+            total += len(ids)
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+    def archive_orders(self, ids, archive):
+        vendors = {}
+        for order_id, vendor_id in Order.vendors.through.objects.filter(order_id__in=ids).values_list('order_id', 'vendor_id'):
+            vendors.setdefault(order_id, []).append(vendor_id)
+        for order in Order.objects.filter(id__in=ids).values():
+            order['vendor_ids'] = vendors.get(order['id'], [])
+            archive.write(json.dumps(order, cls=DjangoJSONEncoder) + '\n')
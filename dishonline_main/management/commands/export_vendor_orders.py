@@ -0,0 +1,51 @@
+"""
+Django Management Command that streams a vendor's orders to a file.
+
+Usage:
+    python manage.py export_vendor_orders <vendor_slug> --output orders.csv
+    python manage.py export_vendor_orders <vendor_slug> --format ndjson --gzip --from 2026-01-01 --to 2026-01-31 --output orders.ndjson.gz
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from orders.export import CONTENT_TYPES, export_chunks, vendor_order_rows
+from vendor.models import Vendor
+
+
+class Command(BaseCommand):
+    help = "Exports a vendor's ordered food lines as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('vendor_slug', help='Slug of the vendor to export')
+        parser.add_argument('--format', choices=sorted(CONTENT_TYPES), default='csv')
+        parser.add_argument('--from', dest='date_from', help='First order date (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last order date (YYYY-MM-DD)')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip')
+        parser.add_argument('--output', help='Output file, defaults to stdout')
+
+    def handle(self, *args, **options):
+        try:
+            vendor = Vendor.objects.get(vendor_slug=options['vendor_slug'])
+        except Vendor.DoesNotExist:
+            raise CommandError(f"Vendor '{options['vendor_slug']}' does not exist")
+
+        try:
+            date_from = parse_date(options['date_from'] or '')
+            date_to = parse_date(options['date_to'] or '')
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        rows = vendor_order_rows(vendor, date_from=date_from, date_to=date_to, chunk_size=options['chunk_size'])
+        chunks = export_chunks(rows, format=options['format'], compress=options['gzip'])
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,49 @@
+"""
+Django Management Command that writes the cached carts left changed to
+the Cart table, so a cart whose customer went away is not kept only in
+the cache (and lost with it). Carts are flushed once they have been dirty
+for CART_FLUSH_INTERVAL seconds; see marketplace.session_cart. Run it
+every minute, e.g. from cron.
+
+Usage:
+    python manage.py flush_carts
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from marketplace.session_cart import CartBusy, SessionCart, dirty_bucket, dirty_user_ids, mark_dirty
+
+
+FLUSHED_BUCKET_KEY = 'cart:dirty:flushed'
+BUCKETS_PER_READ = 500
+
+
+class Command(BaseCommand):
+    help = 'Writes the cached carts changed more than CART_FLUSH_INTERVAL seconds ago to the Cart table'
+
+    def handle(self, *args, **options):
+        # Every cart registered in a bucket up to this one changed at least CART_FLUSH_INTERVAL ago
+        due = dirty_bucket(time.time() - settings.CART_FLUSH_INTERVAL) - 1
+        # The oldest bucket whose carts can still be cached; the first run starts there
+        oldest = due - settings.CART_CACHE_TIMEOUT // settings.CART_FLUSH_INTERVAL
+        flushed = max(cache.get(FLUSHED_BUCKET_KEY, oldest - 1), oldest - 1)
+
+        counts = {'flushed': 0, 'busy': 0}
+        for start in range(flushed + 1, due + 1, BUCKETS_PER_READ):
+            user_ids = dirty_user_ids(range(start, min(start + BUCKETS_PER_READ, due + 1)))
+            for user in User.objects.filter(id__in=user_ids):
+                try:
+                    SessionCart.for_user(user).flush()
+                    counts['flushed'] += 1
+                except CartBusy:
+                    # Try again on a later run
+                    mark_dirty(user.id, time.time())
+                    counts['busy'] += 1
+        cache.set(FLUSHED_BUCKET_KEY, due, None)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Checked {counts['flushed']} carts ({counts['busy']} busy, retried next run)"))
@@ -0,0 +1,52 @@
+"""
+Django Management Command that maintains the monthly partitions of the
+OrderedFood and UserActivity tables (see orders.partitions): it creates
+the partitions of the coming months and, with --keep-months, detaches the
+partitions older than that. Detached partitions can be archived as gzipped
+CSV files and dropped.
+
+Does nothing on databases other than PostgreSQL.
+
+Usage:
+    python manage.py manage_partitions
+    python manage.py manage_partitions --ahead 3
+    python manage.py manage_partitions --keep-months 24 --archive-dir /backups/partitions --drop
+"""
+
+import os
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from orders.partitions import add_months, detach_partitions, ensure_partitions
+
+
+class Command(BaseCommand):
+    help = 'Creates upcoming monthly partitions and detaches old ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3, help='Create partitions up to this many months ahead')
+        parser.add_argument('--keep-months', type=int, help='Detach partitions older than this many months')
+        parser.add_argument('--archive-dir', help='Write detached partitions to this directory as gzipped CSV')
+        parser.add_argument('--drop', action='store_true', help='Drop detached partitions instead of keeping them as tables')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('Partitioning needs PostgreSQL, nothing to do'))
+            return
+        if options['archive_dir'] and not os.path.isdir(options['archive_dir']):
+            raise CommandError(f"Archive directory {options['archive_dir']} does not exist")
+
+        created = ensure_partitions(months_ahead=options['ahead'])
+        for name in created:
+            self.stdout.write(f'Created {name}')
+
+        detached = []
+        if options['keep_months']:
+            before = add_months(date.today().replace(day=1), -options['keep_months'])
+            detached = detach_partitions(before, archive_dir=options['archive_dir'], drop=options['drop'])
+            for name in detached:
+                self.stdout.write(f"{'Dropped' if options['drop'] else 'Detached'} {name}")
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Created {len(created)} and detached {len(detached)} partitions'))
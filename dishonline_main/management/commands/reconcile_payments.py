@@ -0,0 +1,91 @@
+"""
+Django Management Command that checks the unpaid Stripe and SSLCommerz
+orders against the gateways, in case the payment callback was lost.
+Paid orders are finalized; orders the gateway reports as failed or
+expired, and orders still unpaid after --cancel-after hours, are cancelled.
+
+The gateway lookups run in a bounded thread pool, rate limited to --rate
+requests per second. Run it against ``manage.py run_gateway_stub`` to test
+without the real gateways.
+
+Usage:
+    python manage.py reconcile_payments
+    python manage.py reconcile_payments --older-than 30 --cancel-after 24 --workers 8 --rate 20
+    python manage.py reconcile_payments --dry-run  # Only report what would change
+"""
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from orders.models import Order
+from orders.reconcile import ERROR, FAILED, LOOKUPS, PAID, PENDING, RateLimiter, lookup_payment
+from orders.services import FinalizeError, finalize_order
+
+
+class Command(BaseCommand):
+    help = 'Finalizes or cancels unpaid orders according to the payment gateways'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=30, help='Only check orders older than this many minutes')
+        parser.add_argument('--cancel-after', type=int, default=24, help='Cancel orders still unpaid after this many hours')
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders loaded per page')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent gateway lookups')
+        parser.add_argument('--rate', type=float, default=20, help='Gateway requests per second')
+        parser.add_argument('--dry-run', action='store_true', help='Do not change any order')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        cancel_before = now - timedelta(hours=options['cancel_after'])
+        pending = (
+            Order.objects
+            .filter(is_ordered=False, payment_method__in=list(LOOKUPS), created_at__lt=now - timedelta(minutes=options['older_than']))
+            .exclude(status='Cancelled')
+            .only('id', 'order_number', 'payment_method', 'gateway_session_id', 'created_at')
+            .order_by('created_at', 'id')
+        )
+        lookup = partial(lookup_payment, rate_limiter=RateLimiter(options['rate']))
+        counts = Counter()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            last = None
+            while True:
+                # Keyset pagination on (created_at, id), served by orders_history_idx
+                page = pending
+                if last:
+                    page = page.filter(Q(created_at__gt=last.created_at) | Q(created_at=last.created_at, id__gt=last.id))
+                orders = list(page[:options['batch_size']])
+                if not orders:
+                    break
+                last = orders[-1]
+
+                to_cancel = []
+                for order, status in zip(orders, pool.map(lookup, orders)):
+                    if status.state == PAID:
+                        if not options['dry_run']:
+                            try:
+                                finalize_order(order.order_number, status.transaction_id, order.payment_method)
+                            except FinalizeError as e:
+                                self.stderr.write(f'Order {order.order_number}: {e}')
+                                counts['errors'] += 1
+                                continue
+                        counts['finalized'] += 1
+                    elif status.state == FAILED or (status.state == PENDING and order.created_at < cancel_before):
+                        to_cancel.append(order.id)
+                    else:
+                        counts['errors' if status.state == ERROR else 'pending'] += 1
+
+                counts['cancelled'] += len(to_cancel)
+                if to_cancel and not options['dry_run']:
+                    Order.objects.filter(id__in=to_cancel, is_ordered=False).update(status='Cancelled', updated_at=timezone.now())
+                counts['checked'] += len(orders)
+                self.stdout.write(f"Checked {counts['checked']} orders")
+
+        summary = ', '.join(f'{counts[key]} {key}' for key in ('checked', 'finalized', 'cancelled', 'pending', 'errors'))
+        prefix = 'Dry run: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(f'✅ {prefix}{summary}'))
@@ -0,0 +1,43 @@
+"""
+Django Management Command that runs a local stub of the SSLCommerz and
+Stripe APIs, so the payment flow can be tested offline.
+
+Point the app at it with:
+    SSLCOMMERZ_BASE_URL=http://localhost:8002
+    STRIPE_API_BASE=http://localhost:8002
+
+Usage:
+    python manage.py run_gateway_stub
+    python manage.py run_gateway_stub --port 8002 --latency 0.5 --failure-rate 0.1  # Slow, flaky gateway
+    python manage.py run_gateway_stub --stripe-webhook-url http://localhost:8000/orders/stripe_webhook/
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.gateway_stub import make_server
+
+
+class Command(BaseCommand):
+    help = 'Runs a local SSLCommerz and Stripe stub server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8002)
+        parser.add_argument('--latency', type=float, default=0, help='Seconds to wait before every response')
+        parser.add_argument('--failure-rate', type=float, default=0, help='Share of requests answered with HTTP 503')
+        parser.add_argument('--stripe-webhook-url', help='Deliver signed checkout.session.completed events to this url')
+        parser.add_argument('--verbose', action='store_true', help='Log every request')
+
+    def handle(self, *args, **options):
+        server = make_server(
+            options['host'], options['port'], options['latency'], options['failure_rate'], options['verbose'],
+            webhook_url=options['stripe_webhook_url'], webhook_secret=settings.STRIPE_WEBHOOK_SECRET,
+        )
+        self.stdout.write(self.style.SUCCESS(f"✅ Payment gateway stub listening on http://{options['host']}:{options['port']}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
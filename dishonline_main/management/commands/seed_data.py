@@ -11,6 +11,7 @@ import os
 import random
 from decimal import Decimal
 from datetime import datetime, timedelta
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.contrib.gis.geos import Point
 from django.utils.text import slugify
@@ -20,7 +21,7 @@ from django.conf import settings
 from accounts.models import User, UserProfile
 from vendor.models import Vendor, OpeningHour
 from menu.models import Category, FoodItem
-from orders.models import Order, Payment, OrderedFood
+from orders.models import Order, Payment, OrderedFood, OrderVendorTotal
 from orders.utils import generate_order_number
 from recommendations.models import Review, UserActivity
 
@@ -49,6 +50,7 @@ class Command(BaseCommand):
         self.seed_food_items()
         self.seed_opening_hours()
         self.seed_orders()
+        call_command('backfill_vendor_revenue', stdout=self.stdout)
         self.seed_reviews()
         self.seed_user_activities()
 
@@ -475,11 +477,13 @@ class Command(BaseCommand):
                         num_items = random.randint(1, 4)
                         selected_items = random.sample(list(vendor_items), min(num_items, vendor_items.count()))
 
+                        vendor_amount = 0
                         for food_item in selected_items:
                             quantity = random.randint(1, 3)
                             price = float(food_item.price)
                             amount = price * quantity
                             total_amount += amount
+                            vendor_amount += amount
 
                             OrderedFood.objects.create(
                                 order=order,
@@ -491,6 +495,15 @@ class Command(BaseCommand):
                                 amount=amount
                             )
 
+                        vendor_tax = vendor_amount * 0.1  # 10% tax
+                        OrderVendorTotal.objects.create(
+                            order=order,
+                            vendor=vendor,
+                            subtotal=vendor_amount,
+                            total_tax=vendor_tax,
+                            grand_total=vendor_amount + vendor_tax
+                        )
+
                 # Update order total
                 tax = total_amount * 0.1  # 10% tax
                 order.total = total_amount
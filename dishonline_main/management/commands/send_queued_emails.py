@@ -0,0 +1,81 @@
+"""
+Django Management Command that sends the emails queued in the outbox.
+
+Usage:
+    python manage.py send_queued_emails            # Run as a worker
+    python manage.py send_queued_emails --once     # Send one batch and exit
+"""
+
+import time
+from datetime import timedelta
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import OutboxEmail
+from accounts.utils import build_outbox_message
+
+
+class Command(BaseCommand):
+    help = 'Renders and sends the emails queued in the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Send a single batch and exit')
+        parser.add_argument('--batch-size', type=int, default=50, help='Emails sent per SMTP batch')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--max-attempts', type=int, default=5, help='Attempts before an email is marked as failed')
+        parser.add_argument('--backoff', type=int, default=30, help='Base retry delay in seconds, doubled per attempt')
+
+    def handle(self, *args, **options):
+        # One SMTP connection is kept open for the lifetime of the worker
+        connection = get_connection()
+        try:
+            while True:
+                sent = self.send_batch(connection, options)
+                if options['once']:
+                    break
+                if not sent:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+
+    def send_batch(self, connection, options):
+        with transaction.atomic():
+            emails = list(
+                OutboxEmail.objects
+                .select_for_update(skip_locked=True)
+                .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=timezone.now())
+                .order_by('next_attempt_at')[:options['batch_size']]
+            )
+            if not emails:
+                return 0
+
+            sent = 0
+            for email in emails:
+                try:
+                    # No-op while the connection is still open
+                    connection.open()
+                    build_outbox_message(email, connection=connection).send()
+                except Exception as e:
+                    # Drop the connection so the next email reconnects
+                    connection.close()
+                    email.attempts += 1
+                    email.last_error = str(e)
+                    if email.attempts >= options['max_attempts']:
+                        email.status = OutboxEmail.FAILED
+                    else:
+                        delay = options['backoff'] * 2 ** (email.attempts - 1)
+                        email.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+                else:
+                    email.status = OutboxEmail.SENT
+                    email.sent_at = timezone.now()
+                    sent += 1
+
+            OutboxEmail.objects.bulk_update(emails, ['status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at'])
+
+        self.stdout.write(f'Sent {sent} of {len(emails)} emails')
+        return len(emails)
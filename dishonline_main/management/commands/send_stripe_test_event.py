@@ -0,0 +1,60 @@
+"""
+Django Management Command that sends a locally signed Stripe
+checkout.session.completed event for an order to the webhook endpoint,
+signed with STRIPE_WEBHOOK_SECRET.
+
+Usage:
+    python manage.py send_stripe_test_event <order_number>
+    python manage.py send_stripe_test_event <order_number> --url http://localhost:8000/orders/stripe_webhook/
+    python manage.py send_stripe_test_event <order_number> --print  # Only print the payload and signature header
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+import simplejson as json
+
+from orders.gateway_stub import checkout_completed_event, send_stripe_event, stripe_signature_header
+from orders.models import Order
+from orders.services import to_minor_units
+
+
+class Command(BaseCommand):
+    help = 'Sends a signed checkout.session.completed test event for an order'
+
+    def add_arguments(self, parser):
+        parser.add_argument('order_number')
+        parser.add_argument('--url', default='http://localhost:8000/orders/stripe_webhook/', help='Webhook endpoint')
+        parser.add_argument('--print', action='store_true', help='Print the event instead of sending it')
+
+    def handle(self, *args, **options):
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            raise CommandError('STRIPE_WEBHOOK_SECRET is not set')
+        try:
+            order = Order.objects.get(order_number=options['order_number'])
+        except Order.DoesNotExist:
+            raise CommandError(f"Order {options['order_number']} does not exist")
+        if not order.gateway_session_id:
+            raise CommandError(f'Order {order.order_number} has no Stripe checkout session')
+
+        event = checkout_completed_event({
+            'id': order.gateway_session_id,
+            'object': 'checkout.session',
+            'mode': 'payment',
+            'status': 'complete',
+            'payment_status': 'paid',
+            'payment_intent': f'pi_test_{uuid.uuid4().hex[:24]}',
+            'amount_total': to_minor_units(order.total),
+            'currency': 'bdt',
+            'metadata': {'order_number': order.order_number},
+        })
+
+        if options['print']:
+            payload = json.dumps(event)
+            self.stdout.write(payload)
+            self.stdout.write(f'Stripe-Signature: {stripe_signature_header(payload, settings.STRIPE_WEBHOOK_SECRET)}')
+            return
+
+        status = send_stripe_event(options['url'], event, settings.STRIPE_WEBHOOK_SECRET)
+        self.stdout.write(self.style.SUCCESS(f"✅ Sent {event['id']} for order {order.order_number} (HTTP {status})"))
@@ -0,0 +1,40 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCountMiddleware:
+    """
+    DEBUG only: logs the number of queries of every page, how many of them
+    the lazy context processors ran, and which context values were never
+    used by the templates (the queries saved by evaluating them lazily).
+    The count is also sent in the X-Query-Count header.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = len(connection.queries)
+        response = self.get_response(request)
+        total = len(connection.queries) - start
+
+        report = getattr(request, '_lazy_context', {})
+        used = {name: count for name, count in report.items() if count is not None}
+        skipped = sorted(name for name, count in report.items() if count is None)
+        response['X-Query-Count'] = str(total)
+        if report:
+            logger.info(
+                '%s %s: %d queries, %d by context processors (%s); not evaluated: %s',
+                request.method, request.path, total, sum(used.values()),
+                ', '.join(f'{name}={count}' for name, count in sorted(used.items())) or '-',
+                ', '.join(skipped) or '-',
+            )
+        return response
@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'dishonline_main',
     'accounts',
@@ -68,7 +69,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'orders.request_object.RequestObjectMiddleware', # custom middleware created to access the request object in models.py
+    'orders.request_object.RequestObjectMiddleware', # custom middleware that keeps the current request in a context variable
+    'dishonline_main.middleware.QueryCountMiddleware', # DEBUG only: per-page query report
 ]
 
 ROOT_URLCONF = 'dishonline_main.urls'
@@ -116,6 +118,35 @@ DATABASES = {
     }
 }
 
+# Cache
+# The carts live in the cache (see marketplace.session_cart), so it must be
+# shared by all workers in production. Without REDIS_URL each process has
+# its own in-memory cache, which is only fit for runserver.
+
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Seconds a cart is kept in the cache, and the delay after which a changed
+# cart is written to the Cart table: by its next change, or by
+# ``manage.py flush_carts`` (run it every minute) if none comes
+CART_CACHE_TIMEOUT = config('CART_CACHE_TIMEOUT', default=30 * 24 * 3600, cast=int)
+CART_FLUSH_INTERVAL = config('CART_FLUSH_INTERVAL', default=60, cast=int)
+
+# Seconds between checks of the tax version stamp, see marketplace.taxes
+TAX_VERSION_CHECK_INTERVAL = config('TAX_VERSION_CHECK_INTERVAL', default=5, cast=int)
+
+# Geohash precision of the cells sharing cached home and search results
+# (6 is about 1.2 x 0.6 km), and seconds they are kept, see marketplace.geocells
+GEO_CELL_PRECISION = config('GEO_CELL_PRECISION', default=6, cast=int)
+GEO_CELL_CACHE_TIMEOUT = config('GEO_CELL_CACHE_TIMEOUT', default=10 * 60, cast=int)
+
 AUTH_USER_MODEL = 'accounts.User'
 
 
@@ -176,12 +207,27 @@ MEDIA_ROOT = BASE_DIR /'media'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Logging
+# The per-page query report of QueryCountMiddleware (DEBUG only)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'dishonline_main.middleware': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 from django.contrib.messages import constants as messages
 MESSAGE_TAGS = {
     messages.ERROR: 'danger',
 }
 
 # Email configuration
+# Emails are queued in the outbox and sent by `manage.py send_queued_emails`
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST')
 EMAIL_PORT = config('EMAIL_PORT', cast=int)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
@@ -197,8 +243,23 @@ SECURE_CROSS_ORIGIN_OPENER_POLICY = 'same-origin-allow-popups'
 # Stripe (Test Mode)
 STRIPE_PUBLIC_KEY = config('STRIPE_PUBLIC_KEY')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY')
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='https://api.stripe.com')
+STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
 
 # SSLCommerz
 SSLCOMMERZ_STORE_ID = config('SSLCOMMERZ_STORE_ID')
 SSLCOMMERZ_STORE_PASSWORD = config('SSLCOMMERZ_STORE_PASSWORD')
-SSLCOMMERZ_SANDBOX = config('SSLCOMMERZ_SANDBOX', default=True, cast=bool)
\ No newline at end of file
+SSLCOMMERZ_SANDBOX = config('SSLCOMMERZ_SANDBOX', default=True, cast=bool)
+SSLCOMMERZ_BASE_URL = config(
+    'SSLCOMMERZ_BASE_URL',
+    default='https://sandbox.sslcommerz.com' if SSLCOMMERZ_SANDBOX else 'https://securepay.sslcommerz.com',
+)
+
+# Payment gateway HTTP clients (orders/gateways.py)
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = config('PAYMENT_GATEWAY_CONNECT_TIMEOUT', default=3.05, cast=float)
+PAYMENT_GATEWAY_READ_TIMEOUT = config('PAYMENT_GATEWAY_READ_TIMEOUT', default=10, cast=float)
+PAYMENT_GATEWAY_RETRIES = config('PAYMENT_GATEWAY_RETRIES', default=2, cast=int)
+PAYMENT_GATEWAY_POOL_SIZE = config('PAYMENT_GATEWAY_POOL_SIZE', default=10, cast=int)
+PAYMENT_GATEWAY_ASYNC_POOL_SIZE = config('PAYMENT_GATEWAY_ASYNC_POOL_SIZE', default=100, cast=int)
+PAYMENT_GATEWAY_FAILURE_THRESHOLD = config('PAYMENT_GATEWAY_FAILURE_THRESHOLD', default=5, cast=int)
+PAYMENT_GATEWAY_RESET_TIMEOUT = config('PAYMENT_GATEWAY_RESET_TIMEOUT', default=30, cast=int)
\ No newline at end of file
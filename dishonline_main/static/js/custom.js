@@ -227,61 +227,103 @@ $(document).ready(function(){
         }
     }
 
-    // ADD OPENING HOUR
+    // ADD OPENING HOUR (kept in the table until the schedule is saved)
     $('.add_hour').on('click', function(e){
         e.preventDefault();
         var day = document.getElementById('id_day').value
+        var day_name = $('#id_day option:selected').text()
         var from_hour = document.getElementById('id_from_hour').value
         var to_hour = document.getElementById('id_to_hour').value
         var is_closed = document.getElementById('id_is_closed').checked
-        var csrf_token = $('input[name=csrfmiddlewaretoken]').val()
-        var url = document.getElementById('add_hour_url').value
-
-        console.log(day, from_hour, to_hour, is_closed, csrf_token)
 
+        if(day == '' || (!is_closed && (from_hour == '' || to_hour == ''))){
+            swal('Please fill all fields', '', 'info')
+            return
+        }
         if(is_closed){
-            is_closed = 'True'
-            condition = "day != ''"
-        }else{
-            is_closed = 'False'
-            condition = "day != '' && from_hour != '' && to_hour != ''"
+            from_hour = ''
+            to_hour = ''
         }
+        $('.opening_hours tbody').append(hourRow('', day, day_name, from_hour, to_hour, is_closed))
+        sortHours()
+        document.getElementById("opening_hours").reset();
+    });
 
-        if(eval(condition)){
-            $.ajax({
-                type: 'POST',
-                url: url,
-                data: {
-                    'day': day,
-                    'from_hour': from_hour,
-                    'to_hour': to_hour,
-                    'is_closed': is_closed,
-                    'csrfmiddlewaretoken': csrf_token,
-                },
-                success: function(response){
-                    if(response.status == 'success'){
-                        if(response.is_closed == 'Closed'){
-                            html = '<tr id="hour-'+response.id+'"><td><b>'+response.day+'</b></td><td>Closed</td><td><a href="#" class="remove_hour" data-url="/vendor/opening-hours/remove/'+response.id+'/">Remove</a></td></tr>';
-                        }else{
-                            html = '<tr id="hour-'+response.id+'"><td><b>'+response.day+'</b></td><td>'+response.from_hour+' - '+response.to_hour+'</td><td><a href="#" class="remove_hour" data-url="/vendor/opening-hours/remove/'+response.id+'/">Remove</a></td></tr>';
-                        }
-                        
-                        $(".opening_hours").append(html)
-                        document.getElementById("opening_hours").reset();
-                    }else{
-                        swal(response.message, '', "error")
-                    }
-                }
-            })
+    function hourRow(id, day, day_name, from_hour, to_hour, is_closed){
+        var row = $('<tr>').attr({'data-day': day, 'data-from-hour': from_hour, 'data-to-hour': to_hour, 'data-is-closed': is_closed})
+        var remove = $('<a href="#" class="remove_hour">Remove</a>')
+        if(id){
+            row.attr('id', 'hour-'+id)
+            remove.attr('data-url', '/vendor/opening-hours/remove/'+id+'/')
         }else{
-            swal('Please fill all fields', '', 'info')
+            row.addClass('pending_hour')
+        }
+        row.append($('<td>').append($('<b>').text(day_name)))
+        row.append($('<td>').text(is_closed ? 'Closed' : from_hour+' - '+to_hour))
+        row.append($('<td>').append(remove))
+        return row
+    }
+
+    function sortHours(){
+        var rows = $('.opening_hours tbody tr').get().sort(function(a, b){
+            return $(a).attr('data-day') - $(b).attr('data-day')
+        })
+        $('.opening_hours tbody').append(rows)
+    }
+
+    // SAVE OPENING HOURS (every day with new hours, in one request)
+    $('.save_hours').on('click', function(e){
+        e.preventDefault();
+        var days = {}
+        $('.opening_hours tr.pending_hour').each(function(){
+            days[$(this).attr('data-day')] = []
+        })
+        if($.isEmptyObject(days)){
+            swal('There are no new hours to save', '', 'info')
+            return
         }
+        $('.opening_hours tbody tr').each(function(){
+            var day = $(this).attr('data-day')
+            if(day in days){
+                days[day].push({
+                    'from_hour': $(this).attr('data-from-hour'),
+                    'to_hour': $(this).attr('data-to-hour'),
+                    'is_closed': $(this).attr('data-is-closed') == 'true',
+                })
+            }
+        })
+
+        $.ajax({
+            type: 'POST',
+            url: document.getElementById('save_hours_url').value,
+            data: JSON.stringify({'days': days}),
+            contentType: 'application/json',
+            headers: {'X-CSRFToken': $('input[name=csrfmiddlewaretoken]').val()},
+            success: function(response){
+                $('.opening_hours tbody tr').filter(function(){
+                    return $(this).attr('data-day') in days
+                }).remove()
+                $.each(response.hours, function(i, hour){
+                    $('.opening_hours tbody').append(hourRow(hour.id, hour.day_number, hour.day, hour.from_hour || '', hour.to_hour || '', hour.is_closed == 'Closed'))
+                })
+                sortHours()
+                swal('Opening hours saved', '', 'success')
+            },
+            error: function(xhr){
+                swal(xhr.responseJSON ? xhr.responseJSON.message : 'Could not save the opening hours', '', 'error')
+            }
+        })
     });
 
     // REMOVE OPENING HOUR
     $(document).on('click', '.remove_hour', function(e){
         e.preventDefault();
         url = $(this).attr('data-url');
+        if(!url){
+            // Not saved yet
+            $(this).closest('tr').remove()
+            return
+        }
         
         $.ajax({
             type: 'GET',
@@ -24,6 +24,7 @@ from marketplace import views as MarketplaceViews
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.home, name='home'),
+    path('nearby_vendors/', views.nearby_vendors, name='nearby_vendors'),
     path('', include('accounts.urls')),
 
     path('marketplace/', include('marketplace.urls')),
@@ -1,11 +1,10 @@
 from django.shortcuts import render
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
+from django.template.loader import render_to_string
 
+from marketplace.geocells import nearest_vendor_page
 from vendor.models import Vendor
-
-from django.contrib.gis.geos import GEOSGeometry
-from django.contrib.gis.measure import D # ``D`` is a shortcut for ``Distance``
-from django.contrib.gis.db.models.functions import Distance
+from vendor.schedule import set_open_status
 
 
 def get_or_set_current_location(request):
@@ -24,17 +23,29 @@ def get_or_set_current_location(request):
 
 
 def home(request):
-    if get_or_set_current_location(request) is not None:
-
-        pnt = GEOSGeometry('POINT(%s %s)' % (get_or_set_current_location(request)))
-
-        vendors = Vendor.objects.filter(user_profile__location__distance_lte=(pnt, D(km=1000))).annotate(distance=Distance("user_profile__location", pnt)).order_by("distance")
-
-        for v in vendors:
-            v.kms = round(v.distance.km, 1)
+    location = get_or_set_current_location(request)
+    next_cursor = None
+    if location is not None:
+        # Shared by the visitors of a geohash cell, see marketplace.geocells
+        lng, lat = location
+        vendors, next_cursor = nearest_vendor_page(float(lng), float(lat))
     else:
-        vendors = Vendor.objects.filter(is_approved=True, user__is_active=True)[:8]
+        vendors = Vendor.objects.filter(is_approved=True, user__is_active=True).select_related('user_profile')[:8]
+    set_open_status(vendors)
     context = {
         'vendors': vendors,
+        'next_cursor': next_cursor,
     }
-    return render(request, 'home.html', context)
\ No newline at end of file
+    return render(request, 'home.html', context)
+
+
+def nearby_vendors(request):
+    # The "load more" pages of the home page
+    location = get_or_set_current_location(request)
+    if location is None:
+        return JsonResponse({'html': '', 'next_cursor': None})
+    lng, lat = location
+    vendors, next_cursor = nearest_vendor_page(float(lng), float(lat), request.GET.get('cursor'))
+    set_open_status(vendors)
+    html = render_to_string('includes/vendor_card.html', {'vendors': vendors}, request=request)
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
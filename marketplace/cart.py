@@ -0,0 +1,61 @@
+"""
+Persistence of the cached carts (see marketplace.session_cart) in the Cart
+table.
+
+save_cart() writes a whole cart with one upsert statement and one delete,
+so after a flush the table matches the cached cart exactly, and concurrent
+flushes can neither create duplicate lines nor lose an update.
+"""
+
+from django.db import connection, transaction
+
+from menu.models import FoodItem
+from .models import Cart
+from .taxes import calculate_taxes
+
+
+LOAD_SQL = f"""
+SELECT cart.fooditem_id, cart.quantity, food.price
+FROM "{Cart._meta.db_table}" cart
+JOIN "{FoodItem._meta.db_table}" food ON food.id = cart.fooditem_id
+WHERE cart.user_id = %s
+ORDER BY cart.created_at, cart.id
+"""
+
+# Lines of deleted food items are skipped by the join
+SAVE_SQL = f"""
+INSERT INTO "{Cart._meta.db_table}" (user_id, fooditem_id, quantity, created_at, updated_at)
+SELECT %s, food.id, line.quantity, now(), now()
+FROM unnest(%s::bigint[], %s::integer[]) WITH ORDINALITY AS line(fooditem_id, quantity, position)
+JOIN "{FoodItem._meta.db_table}" food ON food.id = line.fooditem_id
+ORDER BY line.position
+ON CONFLICT (user_id, fooditem_id)
+DO UPDATE SET quantity = EXCLUDED.quantity, updated_at = EXCLUDED.updated_at
+WHERE "{Cart._meta.db_table}".quantity <> EXCLUDED.quantity
+"""
+
+DELETE_SQL = f"""
+DELETE FROM "{Cart._meta.db_table}" WHERE user_id = %s AND fooditem_id <> ALL(%s::bigint[])
+"""
+
+
+def load_cart(user_id):
+    """{fooditem_id: (quantity, price)} of the user's Cart rows, in cart order"""
+    with connection.cursor() as cursor:
+        cursor.execute(LOAD_SQL, [user_id])
+        return {fooditem_id: (quantity, price) for fooditem_id, quantity, price in cursor.fetchall()}
+
+
+def save_cart(user_id, quantities):
+    """Make the user's Cart rows match ``quantities`` ({fooditem_id: quantity})"""
+    fooditem_ids = list(quantities)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(SAVE_SQL, [user_id, fooditem_ids, [quantities[i] for i in fooditem_ids]])
+        cursor.execute(DELETE_SQL, [user_id, fooditem_ids])
+
+
+def cart_amounts(subtotal):
+    """The taxes and grand total of a cart ``subtotal``"""
+    tax_dict = calculate_taxes(subtotal)
+    tax = sum(x for key in tax_dict.values() for x in key.values())
+    return dict(subtotal=subtotal, tax=tax, grand_total=subtotal + tax, tax_dict=tax_dict)
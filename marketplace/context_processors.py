@@ -1,40 +1,19 @@
-from .models import Cart, Tax
-from menu.models import FoodItem
+from accounts.context_processors import lazy_context, request_memo
+from .cart import cart_amounts
+from .session_cart import SessionCart
+
+
+def fetch_cart_amounts(request):
+    return request_memo(request, 'cart_amounts', lambda: cart_amounts(SessionCart.for_request(request).subtotal))
 
 
 def get_cart_counter(request):
-    cart_count = 0
-    if request.user.is_authenticated:
-        try:
-            cart_items = Cart.objects.filter(user=request.user)
-            if cart_items:
-                for cart_item in cart_items:
-                    cart_count += cart_item.quantity
-            else:
-                cart_count = 0
-        except:
-            cart_count = 0
-    return dict(cart_count=cart_count)
+    return dict(cart_count=lazy_context(request, 'cart_count', lambda: SessionCart.for_request(request).count))
 
 
 def get_cart_amounts(request):
-    subtotal = 0
-    tax = 0
-    grand_total = 0
-    tax_dict = {}
-    if request.user.is_authenticated:
-        cart_items = Cart.objects.filter(user=request.user)
-        for item in cart_items:
-            fooditem = FoodItem.objects.get(pk=item.fooditem.id)
-            subtotal += (fooditem.price * item.quantity) # subtotal = subtotal + (fooditem.price * item.quantity)
-
-        get_tax = Tax.objects.filter(is_active=True)
-        for i in get_tax:
-            tax_type = i.tax_type
-            tax_percentage = i.tax_percentage
-            tax_amount = round((tax_percentage * subtotal)/100, 2)
-            tax_dict.update({tax_type: {str(tax_percentage) : tax_amount}})
-        
-        tax = sum(x for key in tax_dict.values() for x in key.values())
-        grand_total = subtotal + tax
-    return dict(subtotal=subtotal, tax=tax, grand_total=grand_total, tax_dict=tax_dict)
\ No newline at end of file
+    # One lazy value per key, all sharing one calculation
+    return {
+        key: lazy_context(request, key, lambda key=key: fetch_cart_amounts(request)[key])
+        for key in ('subtotal', 'tax', 'grand_total', 'tax_dict')
+    }
@@ -0,0 +1,203 @@
+"""
+Home and search results shared by the visitors of a geohash cell.
+
+The vendors around a visitor are looked up once per cell (a geohash of
+GEO_CELL_PRECISION characters), keyword and radius bucket. The lookup is
+made from the cell's center, with the radius widened by the cell's half
+diagonal, so the entry holds every vendor that any visitor of the cell can
+reach. Entries keep the vendor ids, search ranks, distances to the cell
+center and coordinates. Each visitor's own distances are computed from the
+coordinates, and only the vendors of the page shown are loaded, by primary
+key, so a repeated search does not run a PostGIS query.
+
+Entries are keyed by a global version, which is bumped when a vendor is
+created or deleted, or when a field that searches match or filter on
+changes: the vendor's name, approval or location, its user's is_active,
+or the names, descriptions and availability of its categories and food
+items (see marketplace.signals).
+"""
+
+import hashlib
+import math
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.gis.db.models import PointField
+from django.contrib.gis.db.models.functions import GeometryDistance
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.core.cache import cache
+from django.db.models import Value
+
+from vendor.models import Vendor
+from vendor.nearby import MAX_DISTANCE_KM, PAGE_SIZE, VendorPage, decode_cursor, encode_cursor, nearest_vendors
+from .search import search_vendors
+
+
+GEO_CELLS_VERSION_KEY = 'geocells:version'
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Mean radius of the earth, the sphere of PostGIS's geography <-> distances
+EARTH_RADIUS_M = 6371008.8
+RADIUS_BUCKETS_KM = (5, 10, 25, 50, 100)
+# Most vendors kept in an entry, nearest to the cell center first
+MAX_CELL_VENDORS = 300
+
+Cell = namedtuple('Cell', ['geohash', 'lng', 'lat', 'half_diagonal'])
+CellVendor = namedtuple('CellVendor', ['id', 'rank', 'center_distance', 'lng', 'lat'])
+
+
+def distance(lng1, lat1, lng2, lat2):
+    """Great-circle distance in meters"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def geohash_cell(lng, lat, precision=None):
+    """The geohash cell of the point, with its center and half diagonal in meters"""
+    precision = precision or settings.GEO_CELL_PRECISION
+    lng_range, lat_range = [-180.0, 180.0], [-90.0, 90.0]
+    geohash, bits, value, even = [], 0, 0, True
+    while len(geohash) < precision:
+        interval, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            geohash.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+
+    center_lng, center_lat = sum(lng_range) / 2, sum(lat_range) / 2
+    half_diagonal = max(distance(center_lng, center_lat, lng_range[1], corner_lat) for corner_lat in lat_range)
+    return Cell(''.join(geohash), center_lng, center_lat, half_diagonal)
+
+
+def radius_bucket(radius_km):
+    """The smallest bucket covering ``radius_km``"""
+    for bucket in RADIUS_BUCKETS_KM:
+        if radius_km <= bucket:
+            return bucket
+    return math.ceil(radius_km / 100) * 100
+
+
+def bump_cells_version():
+    """Drop every cell entry"""
+    cache.set(GEO_CELLS_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def cell_key(version, cell, keyword, radius_km):
+    keyword = hashlib.md5(' '.join(keyword.lower().split()).encode()).hexdigest()
+    return f'geocells:{version}:{cell.geohash}:{radius_km}:{keyword}'
+
+
+def cell_vendors(cell, keyword, radius_km):
+    """
+    The CellVendors matching ``keyword`` within ``radius_km`` plus the
+    half diagonal of the cell's center, nearest first, and whether those
+    are all of them (at most MAX_CELL_VENDORS are kept)
+    """
+    version = cache.get(GEO_CELLS_VERSION_KEY)
+    if version is None:
+        cache.add(GEO_CELLS_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(GEO_CELLS_VERSION_KEY)
+
+    key = cell_key(version, cell, keyword, radius_km)
+    entry = cache.get(key)
+    if entry is None:
+        entry = fetch_cell_vendors(cell, keyword, radius_km)
+        cache.set(key, entry, settings.GEO_CELL_CACHE_TIMEOUT)
+    return entry
+
+
+def fetch_cell_vendors(cell, keyword, radius_km):
+    center = Point(cell.lng, cell.lat, srid=4326)
+    rows = (
+        search_vendors(keyword)
+        .filter(location__dwithin=(center, D(m=radius_km * 1000 + cell.half_diagonal)))
+        .annotate(center_distance=GeometryDistance('location', Value(center, output_field=PointField(geography=True, srid=4326))))
+        .order_by('center_distance', 'id')
+        .values_list('id', 'rank', 'center_distance', 'location')[:MAX_CELL_VENDORS + 1]
+    )
+    vendors = [CellVendor(pk, rank, center_distance, location.x, location.y) for pk, rank, center_distance, location in rows]
+    return vendors[:MAX_CELL_VENDORS], len(vendors) <= MAX_CELL_VENDORS
+
+
+def load_vendors(results):
+    """
+    The Vendors of the (vendor_id, distance) ``results`` in their order,
+    each with ``distance`` and ``kms`` set. Vendors no longer listed are
+    left out.
+    """
+    vendors = (
+        Vendor.objects
+        .filter(is_approved=True, user__is_active=True)
+        .select_related('user_profile')
+        .in_bulk([vendor_id for vendor_id, meters in results])
+    )
+    page = []
+    for vendor_id, meters in results:
+        vendor = vendors.get(vendor_id)
+        if vendor is not None:
+            vendor.distance = meters
+            vendor.kms = round(meters / 1000, 1)
+            page.append(vendor)
+    return page
+
+
+def search_nearby(keyword, lng, lat, radius_km):
+    """
+    The (vendor_id, distance) of the vendors matching ``keyword`` within
+    ``radius_km`` of the visitor, best ranked first, then nearest. None
+    when the cell's entry does not hold all of them.
+    """
+    cell = geohash_cell(lng, lat)
+    vendors, complete = cell_vendors(cell, keyword, radius_bucket(radius_km))
+    if not complete:
+        return None
+
+    results = []
+    for vendor in vendors:
+        meters = distance(lng, lat, vendor.lng, vendor.lat)
+        if meters <= radius_km * 1000:
+            results.append((vendor, meters))
+    results.sort(key=lambda result: (-result[0].rank, result[1], result[0].id))
+    return [(vendor.id, meters) for vendor, meters in results]
+
+
+def nearest_vendor_page(lng, lat, cursor=None, page_size=PAGE_SIZE):
+    """
+    vendor.nearby.nearest_vendors() of the visitor, from the cell's entry
+    while the page lies within it. The cursors are the same, so the pages
+    after the entry continue with the KNN query.
+    """
+    cell = geohash_cell(lng, lat)
+    vendors, complete = cell_vendors(cell, '', MAX_DISTANCE_KM)
+    # The vendors left out of the entry are at least this far away
+    reach = math.inf if complete else vendors[-1].center_distance - cell.half_diagonal
+
+    results = []
+    for vendor in vendors:
+        meters = distance(lng, lat, vendor.lng, vendor.lat)
+        if meters <= MAX_DISTANCE_KM * 1000:
+            results.append((meters, vendor.id))
+    results.sort()
+    position = decode_cursor(cursor)
+    if position:
+        results = [result for result in results if result > position]
+
+    page = results[:page_size + 1]
+    if any(meters >= reach for meters, vendor_id in page) or (len(page) <= page_size and not complete):
+        return nearest_vendors(Point(lng, lat, srid=4326), cursor, page_size)
+
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_cursor(*page[-1])
+    return VendorPage(load_vendors([(vendor_id, meters) for meters, vendor_id in page]), next_cursor)
@@ -0,0 +1,139 @@
+"""
+Cached vendor menus.
+
+The menu of a vendor page (the vendor's name and pictures, the opening
+hours and the categories with their available food items) is built once
+into a JSON representation and an HTML fragment rendered from it. Both are
+cached under the vendor's menu version, which is bumped when the Vendor,
+its UserProfile or any of its Category, FoodItem or OpeningHour rows are
+saved or deleted (see marketplace.signals). A menu page is then read from
+the cache, and only the visitor's cart is added to it.
+
+A menu built while its vendor was being changed is stored under the old
+version, which is never read again. When a vendor's slug changes, the
+version of the old slug is bumped too, so the old slug no longer finds the
+menu.
+"""
+
+import uuid
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+
+from menu.models import Category, FoodItem
+from vendor.models import OpeningHour, Vendor
+from vendor.schedule import compile_schedule
+
+
+MENU_CACHE_TIMEOUT = 24 * 3600
+
+
+def version_key(vendor_slug):
+    return f'menu:version:{vendor_slug}'
+
+
+def menu_key(vendor_slug, version):
+    return f'menu:{vendor_slug}:{version}'
+
+
+def bump_menu_version(vendor_slug):
+    """Make the next menu page of the vendor rebuild its menu"""
+    cache.set(version_key(vendor_slug), uuid.uuid4().hex, None)
+
+
+def bump_vendor_menu(vendor_id):
+    vendor_slug = Vendor.objects.filter(pk=vendor_id).values_list('vendor_slug', flat=True).first()
+    if vendor_slug:
+        bump_menu_version(vendor_slug)
+
+
+def get_menu(vendor_slug):
+    """
+    The cached menu of the vendor, a dict of its ``data`` (the JSON
+    representation), its ``html`` fragment and its compiled opening hours
+    ``schedule``. None if there is no such vendor.
+    """
+    version = cache.get(version_key(vendor_slug))
+    if version is None:
+        cache.add(version_key(vendor_slug), uuid.uuid4().hex, None)
+        version = cache.get(version_key(vendor_slug))
+
+    menu = cache.get(menu_key(vendor_slug, version))
+    if menu is None:
+        menu = build_menu(vendor_slug)
+        if menu is not None:
+            cache.set(menu_key(vendor_slug, version), menu, MENU_CACHE_TIMEOUT)
+    return menu
+
+
+def build_menu(vendor_slug):
+    vendor = Vendor.objects.select_related('user_profile').filter(vendor_slug=vendor_slug).first()
+    if vendor is None:
+        return None
+    categories = Category.objects.filter(vendor=vendor).prefetch_related(
+        Prefetch(
+            'fooditems',
+            queryset=FoodItem.objects.filter(is_available=True)
+        )
+    )
+    opening_hours = list(OpeningHour.objects.filter(vendor=vendor).order_by('day', 'from_hour'))
+
+    data = {
+        'vendor': vendor_data(vendor),
+        'opening_hours': [opening_hour_data(hour) for hour in opening_hours],
+        'categories': [category_data(category) for category in categories],
+    }
+    return {
+        'data': data,
+        'html': render_to_string('marketplace/menu.html', {'categories': data['categories']}),
+        'schedule': compile_schedule(
+            (hour.open_minute, hour.close_minute)
+            for hour in opening_hours
+            if not hour.is_closed and hour.open_minute is not None
+        ),
+    }
+
+
+def image_url(image):
+    return image.url if image else ''
+
+
+def vendor_data(vendor):
+    profile = vendor.user_profile
+    return {
+        'id': vendor.id,
+        'name': vendor.vendor_name,
+        'slug': vendor.vendor_slug,
+        'address': profile.address or '',
+        'profile_picture': image_url(profile.profile_picture),
+        'cover_photo': image_url(profile.cover_photo),
+    }
+
+
+def opening_hour_data(hour):
+    return {
+        'day': hour.day,
+        'day_name': hour.get_day_display(),
+        'from_hour': hour.from_hour,
+        'to_hour': hour.to_hour,
+        'is_closed': hour.is_closed,
+    }
+
+
+def category_data(category):
+    return {
+        'id': category.id,
+        'name': category.category_name,
+        'description': category.description,
+        'items': [
+            {
+                'id': food.id,
+                'title': food.food_title,
+                'description': food.description,
+                'price': str(food.price),
+                'image': image_url(food.image),
+            }
+            for food in category.fooditems.all()
+        ],
+    }
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.3 on 2026-10-19 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0003_alter_tax_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['updated_at'], name='marketplace_cart_updated_idx'),
+        ),
+    ]
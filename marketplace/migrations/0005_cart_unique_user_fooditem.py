@@ -0,0 +1,33 @@
+# Generated by Django 4.0.3 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    # Concurrent add-to-cart clicks could create the same cart line twice.
+    # Keep the oldest row with the summed quantity.
+    Cart = apps.get_model('marketplace', 'Cart')
+
+    duplicates = (
+        Cart.objects.values('user_id', 'fooditem_id')
+        .annotate(count=models.Count('id'), keep_id=models.Min('id'), total=models.Sum('quantity'))
+        .filter(count__gt=1)
+    )
+    for dup in duplicates:
+        Cart.objects.filter(id=dup['keep_id']).update(quantity=dup['total'])
+        Cart.objects.filter(user_id=dup['user_id'], fooditem_id=dup['fooditem_id']).exclude(id=dup['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0004_cart_updated_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'fooditem'), name='unique_cart_user_fooditem'),
+        ),
+    ]
@@ -11,6 +11,16 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # One row per food item; cart clicks upsert it, see marketplace.cart
+            models.UniqueConstraint(fields=['user', 'fooditem'], name='unique_cart_user_fooditem'),
+        ]
+        indexes = [
+            # Stale cart compaction, see the compact_orders command
+            models.Index(fields=['updated_at'], name='marketplace_cart_updated_idx'),
+        ]
+
     def __unicode__(self):
         return self.user
 
@@ -0,0 +1,53 @@
+"""
+Restaurant search by keyword.
+
+FoodItem.search_vector holds the weighted words of the food title (A),
+its category and vendor names (B) and its description (C). It is
+maintained by database triggers (menu migration 0005). Full-text matches
+are combined with pg_trgm word similarity on food titles and vendor names,
+so misspelt keywords still find something. All of these lookups are
+served by GIN indexes.
+
+A restaurant ranks by its best matching food item, or by the similarity of
+its name when that is higher.
+"""
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from menu.models import FoodItem
+from vendor.models import Vendor
+
+
+SEARCH_CONFIG = 'english'
+PAGE_SIZE = 20
+
+
+def search_fooditems(keyword):
+    """Available food items matching ``keyword``, annotated with their ``rank``"""
+    query = SearchQuery(keyword, config=SEARCH_CONFIG, search_type='websearch')
+    return (
+        FoodItem.objects
+        .filter(is_available=True)
+        .filter(Q(search_vector=query) | Q(food_title__trigram_word_similar=keyword))
+        .annotate(rank=SearchRank(F('search_vector'), query) + TrigramWordSimilarity(keyword, 'food_title'))
+    )
+
+
+def search_vendors(keyword):
+    """Approved vendors matching ``keyword``, annotated with their ``rank``"""
+    vendors = Vendor.objects.filter(is_approved=True, user__is_active=True)
+    if not keyword:
+        return vendors.annotate(rank=Value(0.0, output_field=FloatField()))
+
+    fooditems = search_fooditems(keyword)
+    best_rank = fooditems.filter(vendor=OuterRef('pk')).order_by('-rank').values('rank')[:1]
+    return (
+        vendors
+        .filter(Q(id__in=fooditems.values('vendor_id')) | Q(vendor_name__trigram_word_similar=keyword))
+        .annotate(rank=Greatest(
+            Coalesce(Subquery(best_rank, output_field=FloatField()), Value(0.0)),
+            TrigramWordSimilarity(keyword, 'vendor_name'),
+        ))
+    )
@@ -0,0 +1,263 @@
+"""
+The cart engine. The active cart lives in the cache and is the source of
+truth for reads, so cart clicks, the cart badge and the cart totals
+normally cost no database query.
+
+Customers' carts are keyed by user and written behind to the Cart table
+(marketplace.cart.save_cart): on their next change once
+CART_FLUSH_INTERVAL seconds have passed, on logout, by flush() before a
+view reads the Cart rows (cart page, checkout, place_order), and by
+``manage.py flush_carts`` for the carts left changed. A cart that becomes
+dirty is registered under the CART_FLUSH_INTERVAL bucket of the time of
+the change (mark_dirty()), which flush_carts reads back once the bucket
+is due, so no cart stays only in the cache for longer than the interval
+plus the command's period. Anonymous visitors get a cart
+keyed by a random id kept in their session; it is merged into their own
+cart when they log in. finalize_order() takes the ordered quantities out
+of the Cart rows and, once committed, out of the cached cart (take()).
+
+Changes are made under a per-cart lock. A change that cannot take it
+within LOCK_TIMEOUT raises CartBusy instead of overwriting a concurrent
+change.
+
+The cache must be shared by all workers (REDIS_URL) in production.
+"""
+
+import logging
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from menu.models import FoodItem
+from .cart import load_cart, save_cart
+
+
+logger = logging.getLogger(__name__)
+
+CART_SESSION_KEY = 'cart_id'
+LOCK_TIMEOUT = 5  # Seconds to wait for the cart lock
+# Seconds the lock lives if its holder dies; well above the longest critical
+# section, a flush() writing and reloading the Cart rows
+LOCK_TTL = 60
+CART_BUSY_MESSAGE = 'Your cart is being updated, please try again.'
+
+CartItem = namedtuple('CartItem', ['fooditem_id', 'quantity', 'price'])
+
+
+class CartBusy(Exception):
+    """The cart lock could not be taken within LOCK_TIMEOUT"""
+
+
+def dirty_bucket(timestamp):
+    return int(timestamp // settings.CART_FLUSH_INTERVAL)
+
+
+def mark_dirty(user_id, timestamp):
+    """Register the cart of ``user_id``, changed at ``timestamp``, for flush_carts"""
+    bucket_key = f'cart:dirty:{dirty_bucket(timestamp)}'
+    cache.add(bucket_key, 0, settings.CART_CACHE_TIMEOUT)
+    try:
+        index = cache.incr(bucket_key)
+    except ValueError:
+        # The counter expired in between
+        cache.add(bucket_key, 0, settings.CART_CACHE_TIMEOUT)
+        index = cache.incr(bucket_key)
+    cache.set(f'{bucket_key}:{index}', user_id, settings.CART_CACHE_TIMEOUT)
+
+
+def dirty_user_ids(buckets):
+    """The ids of the users whose carts were registered in ``buckets``"""
+    buckets = list(buckets)
+    counts = cache.get_many([f'cart:dirty:{bucket}' for bucket in buckets])
+    keys = [f'{bucket_key}:{index}' for bucket_key, count in counts.items() for index in range(1, count + 1)]
+    return set(cache.get_many(keys).values()) if keys else set()
+
+
+class SessionCart:
+
+    def __init__(self, owner=None, user=None):
+        self.key = f'cart:{owner}' if owner else None
+        self.user = user
+        self.state = None
+
+    @classmethod
+    def for_user(cls, user):
+        return cls(f'user:{user.id}', user)
+
+    @classmethod
+    def for_request(cls, request, create=False):
+        """
+        The cart of the request's user or anonymous session, shared by all
+        callers during the request. An anonymous visitor only gets a cart id
+        (and a session) once ``create`` is set, i.e. on the first cart click.
+        """
+        cart = getattr(request, '_session_cart', None)
+        if cart is None or (create and cart.key is None):
+            if request.user.is_authenticated:
+                cart = cls.for_user(request.user)
+            else:
+                cart_id = request.session.get(CART_SESSION_KEY)
+                if cart_id is None and create:
+                    cart_id = request.session[CART_SESSION_KEY] = uuid.uuid4().hex
+                cart = cls(f'anonymous:{cart_id}' if cart_id else None)
+            request._session_cart = cart
+        return cart
+
+    @classmethod
+    def discard(cls, user_id):
+        """Drop the cached cart of ``user_id``; it is reloaded from the Cart table"""
+        cache.delete(f'cart:user:{user_id}')
+
+    def load(self):
+        if self.state is None:
+            state = cache.get(self.key) if self.key else None
+            if state is None:
+                state = {'items': load_cart(self.user.id) if self.user else {}, 'dirty_since': None}
+                if self.key:
+                    cache.set(self.key, state, settings.CART_CACHE_TIMEOUT)
+            self.state = state
+        return self.state
+
+    @contextmanager
+    def locked(self):
+        """
+        Reload the cart and hold the cart lock while changing it, then store
+        it. Raises CartBusy when the lock is not free within LOCK_TIMEOUT.
+        """
+        lock_key = f'{self.key}:lock'
+        # The holder's token: only the holder releases the lock
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        acquired = cache.add(lock_key, token, LOCK_TTL)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(0.01)
+            acquired = cache.add(lock_key, token, LOCK_TTL)
+        if not acquired:
+            raise CartBusy(f'{self.key} is locked')
+        try:
+            self.state = None
+            state = self.load()
+            yield state
+            cache.set(self.key, state, settings.CART_CACHE_TIMEOUT)
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+            else:
+                logger.warning('The lock of %s expired while it was held', self.key)
+
+    @property
+    def items(self):
+        return [CartItem(fooditem_id, quantity, price) for fooditem_id, (quantity, price) in self.load()['items'].items()]
+
+    @property
+    def count(self):
+        return sum(quantity for quantity, _ in self.load()['items'].values())
+
+    @property
+    def subtotal(self):
+        return sum((price * quantity for quantity, price in self.load()['items'].values()), 0)
+
+    def quantity(self, fooditem_id):
+        return self.load()['items'].get(fooditem_id, (0, None))[0]
+
+    def add(self, fooditem_id):
+        """Add one ``fooditem_id``; returns the new quantity, None if the food item does not exist"""
+        price = None
+        if fooditem_id not in self.load()['items']:
+            # Only the first click on a food item reads it
+            price = FoodItem.objects.filter(id=fooditem_id).values_list('price', flat=True).first()
+            if price is None:
+                return None
+        with self.locked() as state:
+            quantity, price = state['items'].get(fooditem_id, (0, price))
+            state['items'][fooditem_id] = (quantity + 1, price)
+            self._changed(state)
+        self.flush_if_due()
+        return quantity + 1
+
+    def decrease(self, fooditem_id):
+        """Remove one ``fooditem_id``; returns the new quantity, None if it is not in the cart"""
+        with self.locked() as state:
+            if fooditem_id not in state['items']:
+                return None
+            quantity, price = state['items'][fooditem_id]
+            if quantity > 1:
+                state['items'][fooditem_id] = (quantity - 1, price)
+            else:
+                del state['items'][fooditem_id]
+            self._changed(state)
+        self.flush_if_due()
+        return quantity - 1
+
+    def remove(self, fooditem_id):
+        """Remove the ``fooditem_id`` line; False if it is not in the cart"""
+        with self.locked() as state:
+            if state['items'].pop(fooditem_id, None) is None:
+                return False
+            self._changed(state)
+        self.flush_if_due()
+        return True
+
+    def merge(self, other):
+        """Add the items of the cart ``other`` to this cart and delete ``other``"""
+        items = other.load()['items']
+        if items:
+            with self.locked() as state:
+                for fooditem_id, (quantity, price) in items.items():
+                    current = state['items'].get(fooditem_id, (0, price))[0]
+                    state['items'][fooditem_id] = (current + quantity, price)
+                self._changed(state)
+            self.flush()
+        other.clear()
+
+    def take(self, quantities):
+        """
+        Take the ordered ``quantities`` ({fooditem_id: quantity}) out of the
+        cached cart; finalize_order() has already taken them out of the Cart
+        rows. Nothing to do when the cart is not cached.
+        """
+        if cache.get(self.key) is None:
+            return
+        with self.locked() as state:
+            for fooditem_id, ordered in quantities.items():
+                quantity, price = state['items'].get(fooditem_id, (0, None))
+                if quantity > ordered:
+                    state['items'][fooditem_id] = (quantity - ordered, price)
+                else:
+                    state['items'].pop(fooditem_id, None)
+
+    def clear(self):
+        if self.key:
+            cache.delete(self.key)
+        self.state = None
+
+    def flush(self):
+        """Write the cart to the Cart table and refresh its prices"""
+        if self.user is None or self.load()['dirty_since'] is None:
+            return
+        with self.locked() as state:
+            if state['dirty_since'] is not None:
+                save_cart(self.user.id, {fooditem_id: quantity for fooditem_id, (quantity, _) in state['items'].items()})
+                state['items'] = load_cart(self.user.id)
+                state['dirty_since'] = None
+
+    def flush_if_due(self):
+        dirty_since = self.load()['dirty_since']
+        if dirty_since is not None and time.time() - dirty_since >= settings.CART_FLUSH_INTERVAL:
+            try:
+                self.flush()
+            except CartBusy:
+                # Still dirty, so the next change, flush() or flush_carts writes it
+                pass
+
+    def _changed(self, state):
+        if self.key is None:
+            raise ValueError('This cart has no owner; use SessionCart.for_request(request, create=True)')
+        if state['dirty_since'] is None:
+            state['dirty_since'] = time.time()
+            if self.user is not None:
+                mark_dirty(self.user.id, state['dirty_since'])
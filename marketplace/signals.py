@@ -0,0 +1,138 @@
+import logging
+
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from accounts.models import User, UserProfile
+from menu.models import Category, FoodItem
+from vendor.models import OpeningHour, Vendor
+from .geocells import bump_cells_version
+from .menu_cache import bump_menu_version, bump_vendor_menu
+from .models import Tax
+from .session_cart import CART_SESSION_KEY, CartBusy, SessionCart
+from .taxes import bump_version
+
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(user_logged_in)
+def merge_anonymous_cart(sender, request, user, **kwargs):
+    # The cart id survives the session key rotation of login()
+    cart_id = request.session.pop(CART_SESSION_KEY, None)
+    if cart_id:
+        try:
+            SessionCart.for_user(user).merge(SessionCart(f'anonymous:{cart_id}'))
+        except CartBusy:
+            logger.warning('Cart of user %s is busy, the anonymous cart %s was not merged', user.id, cart_id)
+    request._session_cart = None
+
+
+@receiver(user_logged_out)
+def flush_cart(sender, request, user, **kwargs):
+    if user is not None:
+        try:
+            SessionCart.for_user(user).flush()
+        except CartBusy:
+            # The cached cart stays dirty and is written by its next flush
+            logger.warning('Cart of user %s is busy, not flushed on logout', user.id)
+
+
+@receiver(post_save, sender=Tax)
+@receiver(post_delete, sender=Tax)
+def invalidate_taxes(sender, **kwargs):
+    transaction.on_commit(bump_version)
+
+
+@receiver(pre_save, sender=Vendor)
+def remember_vendor_slug(sender, instance, **kwargs):
+    # The menu is cached by slug; a renamed vendor's old slug must stop serving it
+    instance._saved_vendor_slug = None
+    if instance.pk:
+        instance._saved_vendor_slug = Vendor.objects.filter(pk=instance.pk).values_list('vendor_slug', flat=True).first()
+
+
+@receiver(post_save, sender=Vendor)
+@receiver(post_delete, sender=Vendor)
+def invalidate_vendor_menu(sender, instance, **kwargs):
+    vendor_slugs = {instance.vendor_slug, getattr(instance, '_saved_vendor_slug', None)} - {None}
+    for vendor_slug in vendor_slugs:
+        transaction.on_commit(lambda vendor_slug=vendor_slug: bump_menu_version(vendor_slug))
+
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_vendor_profile(sender, instance, **kwargs):
+    # The menu shows the vendor's pictures and address, and the vendor
+    # location is copied from the profile (see vendor.signals)
+    vendor_slugs = list(Vendor.objects.filter(user_profile=instance).values_list('vendor_slug', flat=True))
+    for vendor_slug in vendor_slugs:
+        transaction.on_commit(lambda vendor_slug=vendor_slug: bump_menu_version(vendor_slug))
+    if vendor_slugs and searched_fields_changed(instance):
+        transaction.on_commit(bump_cells_version)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=FoodItem)
+@receiver(post_delete, sender=FoodItem)
+@receiver(post_save, sender=OpeningHour)
+@receiver(post_delete, sender=OpeningHour)
+def invalidate_menu(sender, instance, **kwargs):
+    vendor_id = instance.vendor_id
+    transaction.on_commit(lambda: bump_vendor_menu(vendor_id))
+
+
+# The fields that change which vendors a search finds, or where they are.
+# The cell entries are only dropped when one of them changes.
+SEARCHED_FIELDS = {
+    Vendor: ('vendor_name', 'is_approved'),
+    UserProfile: ('location',),
+    Category: ('category_name',),
+    FoodItem: ('food_title', 'description', 'is_available', 'category_id', 'vendor_id'),
+    User: ('is_active',),
+}
+
+
+@receiver(pre_save, sender=Vendor)
+@receiver(pre_save, sender=UserProfile)
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=FoodItem)
+@receiver(pre_save, sender=User)
+def remember_searched_fields(sender, instance, update_fields=None, **kwargs):
+    fields = SEARCHED_FIELDS[sender]
+    if update_fields is not None and not set(update_fields) & {sender._meta.get_field(field).name for field in fields}:
+        # e.g. the last_login update of every login
+        instance._searched_values = tuple(getattr(instance, field) for field in fields)
+    elif instance.pk:
+        instance._searched_values = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+    else:
+        instance._searched_values = None
+
+
+def searched_fields_changed(instance):
+    saved = getattr(instance, '_searched_values', None)
+    return saved != tuple(getattr(instance, field) for field in SEARCHED_FIELDS[type(instance)])
+
+
+@receiver(post_save, sender=Vendor)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=FoodItem)
+def invalidate_geo_cells(sender, instance, **kwargs):
+    if searched_fields_changed(instance):
+        transaction.on_commit(bump_cells_version)
+
+
+@receiver(post_delete, sender=Vendor)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=FoodItem)
+def invalidate_geo_cells_on_delete(sender, **kwargs):
+    transaction.on_commit(bump_cells_version)
+
+
+@receiver(post_save, sender=User)
+def invalidate_vendor_user(sender, instance, **kwargs):
+    # Deactivated vendors are no longer listed
+    if searched_fields_changed(instance) and Vendor.objects.filter(user=instance).exists():
+        transaction.on_commit(bump_cells_version)
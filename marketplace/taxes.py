@@ -0,0 +1,60 @@
+"""
+The active tax rules, cached in process memory.
+
+Every worker keeps the compiled rules of the active Tax rows and reloads
+them when the version stamp in the shared cache changes. Saving or
+deleting a Tax row bumps the stamp (see marketplace.signals). The stamp is
+read at most every TAX_VERSION_CHECK_INTERVAL seconds, so a tax lookup is
+normally a memory read.
+"""
+
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Tax
+
+
+TAX_VERSION_KEY = 'taxes:version'
+
+TaxRule = namedtuple('TaxRule', ['tax_type', 'percentage'])
+
+_lock = threading.Lock()
+_rules = None
+_version = None
+_checked_at = 0
+
+
+def bump_version():
+    """Make every worker reload the tax rules"""
+    cache.set(TAX_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def active_taxes():
+    """The TaxRules of the active taxes"""
+    global _rules, _version, _checked_at
+    now = time.monotonic()
+    if _rules is not None and now - _checked_at < settings.TAX_VERSION_CHECK_INTERVAL:
+        return _rules
+    with _lock:
+        version = cache.get(TAX_VERSION_KEY)
+        if _rules is None or version != _version:
+            _rules = tuple(
+                TaxRule(tax_type, percentage)
+                for tax_type, percentage in Tax.objects.filter(is_active=True).order_by('id').values_list('tax_type', 'tax_percentage')
+            )
+            _version = version
+        _checked_at = now
+    return _rules
+
+
+def calculate_taxes(subtotal):
+    """The tax_data of ``subtotal``: {tax_type: {tax_percentage: tax_amount}}"""
+    return {
+        rule.tax_type: {str(rule.percentage): round((rule.percentage * subtotal) / 100, 2)}
+        for rule in active_taxes()
+    }
@@ -5,6 +5,7 @@ urlpatterns = [
     path('', views.marketplace, name='marketplace'),
     
     path('<slug:vendor_slug>/', views.vendor_detail, name='vendor_detail'),
+    path('<slug:vendor_slug>/menu.json', views.vendor_menu, name='vendor_menu'),
 
     # ADD TO CART
     path('add_to_cart/<int:food_id>/', views.add_to_cart, name='add_to_cart'),
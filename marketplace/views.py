@@ -1,58 +1,72 @@
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
 from accounts.models import UserProfile
-from .context_processors import get_cart_counter, get_cart_amounts
-from menu.models import Category, FoodItem
-
-from vendor.models import OpeningHour, Vendor
-from django.db.models import Prefetch
+from .cart import cart_amounts
+from .geocells import load_vendors, search_nearby
+from .menu_cache import get_menu
+from .search import PAGE_SIZE, search_vendors
+from .session_cart import CART_BUSY_MESSAGE, CartBusy, SessionCart
+
+from vendor.models import Vendor
+from vendor.hours import minute_of_week
+from vendor.schedule import is_open_at, open_vendor_ids, set_open_status
 from .models import Cart
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.core.paginator import Paginator
+from django.utils import timezone
 
 from django.contrib.gis.geos import GEOSGeometry
 from django.contrib.gis.measure import D # ``D`` is a shortcut for ``Distance``
 from django.contrib.gis.db.models.functions import Distance
 
-from datetime import date, datetime
+from datetime import datetime
 from orders.forms import OrderForm
 
 
+def open_now_param(request):
+    """Whether only the open vendors are listed (?open_now=1), and the query string toggling it"""
+    params = request.GET.copy()
+    params.pop('page', None)
+    open_now = params.pop('open_now', None) is not None
+    if not open_now:
+        params['open_now'] = '1'
+    return open_now, params.urlencode()
+
+
 def marketplace(request):
-    vendors = Vendor.objects.filter(is_approved=True, user__is_active=True)
-    vendor_count = vendors.count()
+    vendors = Vendor.objects.filter(is_approved=True, user__is_active=True).select_related('user_profile')
+    open_now, open_now_query = open_now_param(request)
+    if open_now:
+        vendors = vendors.open_at(timezone.now())
+    vendors = set_open_status(vendors)
+    vendor_count = len(vendors)
     context = {
         'vendors': vendors,
         'vendor_count': vendor_count,
+        'open_now': open_now,
+        'open_now_query': open_now_query,
     }
     return render(request, 'marketplace/listings.html', context)
 
 
 def vendor_detail(request, vendor_slug):
-    vendor = get_object_or_404(Vendor, vendor_slug=vendor_slug)
-
-    categories = Category.objects.filter(vendor=vendor).prefetch_related(
-        Prefetch(
-            'fooditems',
-            queryset = FoodItem.objects.filter(is_available=True)
-        )
-    )
+    # The menu comes from the cache, see marketplace.menu_cache
+    menu = get_menu(vendor_slug)
+    if menu is None:
+        raise Http404('No Vendor matches the given query.')
 
-    opening_hours = OpeningHour.objects.filter(vendor=vendor).order_by('day', 'from_hour')
-    
     # Check current day's opening hours.
-    today_date = date.today()
-    today = today_date.isoweekday()
-    
-    current_opening_hours = OpeningHour.objects.filter(vendor=vendor, day=today)
-    if request.user.is_authenticated:
-        cart_items = Cart.objects.filter(user=request.user)
-    else:
-        cart_items = None
+    today = timezone.localdate().isoweekday()
+    opening_hours = menu['data']['opening_hours']
+    current_opening_hours = [hour for hour in opening_hours if hour['day'] == today]
+
+    cart_items = SessionCart.for_request(request).items
     context = {
-        'vendor': vendor,
-        'categories': categories,
+        'vendor': menu['data']['vendor'],
+        'is_open': is_open_at(menu['schedule'], minute_of_week()),
+        'menu_html': menu['html'],
         'cart_items': cart_items,
         'opening_hours': opening_hours,
         'current_opening_hours': current_opening_hours,
@@ -60,61 +74,61 @@ def vendor_detail(request, vendor_slug):
     return render(request, 'marketplace/vendor_detail.html', context)
 
 
+def vendor_menu(request, vendor_slug):
+    menu = get_menu(vendor_slug)
+    if menu is None:
+        raise Http404('No Vendor matches the given query.')
+    return JsonResponse(menu['data'])
+
+
+def cart_response(cart, quantity, **extra):
+    # Everything the cart widgets need, read from the cached cart
+    return JsonResponse({
+        'status': 'Success',
+        **extra,
+        'cart_counter': {'cart_count': cart.count},
+        'qty': quantity,
+        'cart_amount': cart_amounts(cart.subtotal),
+    })
+
+
 def add_to_cart(request, food_id):
-    if request.user.is_authenticated:
-        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            # Check if the food item exists
-            try:
-                fooditem = FoodItem.objects.get(id=food_id)
-                # Check if the user has already added that food to the cart
-                try:
-                    chkCart = Cart.objects.get(user=request.user, fooditem=fooditem)
-                    # Increase the cart quantity
-                    chkCart.quantity += 1
-                    chkCart.save()
-                    return JsonResponse({'status': 'Success', 'message': 'Increased the cart quantity', 'cart_counter': get_cart_counter(request), 'qty': chkCart.quantity, 'cart_amount': get_cart_amounts(request)})
-                except:
-                    chkCart = Cart.objects.create(user=request.user, fooditem=fooditem, quantity=1)
-                    return JsonResponse({'status': 'Success', 'message': 'Added the food to the cart', 'cart_counter': get_cart_counter(request), 'qty': chkCart.quantity, 'cart_amount': get_cart_amounts(request)})
-            except:
-                return JsonResponse({'status': 'Failed', 'message': 'This food does not exist!'})
-        else:
-            return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
-        
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        # Anonymous visitors get a session cart, merged into theirs on login
+        cart = SessionCart.for_request(request, create=True)
+        try:
+            quantity = cart.add(food_id)
+        except CartBusy:
+            return JsonResponse({'status': 'Failed', 'message': CART_BUSY_MESSAGE})
+        if quantity is None:
+            return JsonResponse({'status': 'Failed', 'message': 'This food does not exist!'})
+        message = 'Added the food to the cart' if quantity == 1 else 'Increased the cart quantity'
+        return cart_response(cart, quantity, message=message)
     else:
-        return JsonResponse({'status': 'login_required', 'message': 'Please login to continue'})
+        return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
 
 
 def decrease_cart(request, food_id):
-    if request.user.is_authenticated:
-        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            # Check if the food item exists
-            try:
-                fooditem = FoodItem.objects.get(id=food_id)
-                # Check if the user has already added that food to the cart
-                try:
-                    chkCart = Cart.objects.get(user=request.user, fooditem=fooditem)
-                    if chkCart.quantity > 1:
-                        # decrease the cart quantity
-                        chkCart.quantity -= 1
-                        chkCart.save()
-                    else:
-                        chkCart.delete()
-                        chkCart.quantity = 0
-                    return JsonResponse({'status': 'Success', 'cart_counter': get_cart_counter(request), 'qty': chkCart.quantity, 'cart_amount': get_cart_amounts(request)})
-                except:
-                    return JsonResponse({'status': 'Failed', 'message': 'You do not have this item in your cart!'})
-            except:
-                return JsonResponse({'status': 'Failed', 'message': 'This food does not exist!'})
-        else:
-            return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
-        
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        cart = SessionCart.for_request(request, create=True)
+        try:
+            quantity = cart.decrease(food_id)
+        except CartBusy:
+            return JsonResponse({'status': 'Failed', 'message': CART_BUSY_MESSAGE})
+        if quantity is None:
+            return JsonResponse({'status': 'Failed', 'message': 'You do not have this item in your cart!'})
+        return cart_response(cart, quantity)
     else:
-        return JsonResponse({'status': 'login_required', 'message': 'Please login to continue'})
+        return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
 
 
 @login_required(login_url = 'login')
 def cart(request):
+    try:
+        SessionCart.for_request(request).flush()
+    except CartBusy:
+        messages.error(request, CART_BUSY_MESSAGE)
+        return redirect('marketplace')
     cart_items = Cart.objects.filter(user=request.user).order_by('created_at')
     context = {
         'cart_items': cart_items,
@@ -125,14 +139,16 @@ def cart(request):
 def delete_cart(request, cart_id):
     if request.user.is_authenticated:
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            # The cart page lists the flushed Cart rows
+            fooditem_id = Cart.objects.filter(user=request.user, id=cart_id).values_list('fooditem_id', flat=True).first()
+            cart = SessionCart.for_request(request)
             try:
-                # Check if the cart item exists
-                cart_item = Cart.objects.get(user=request.user, id=cart_id)
-                if cart_item:
-                    cart_item.delete()
-                    return JsonResponse({'status': 'Success', 'message': 'Cart item has been deleted!', 'cart_counter': get_cart_counter(request), 'cart_amount': get_cart_amounts(request)})
-            except:
+                removed = fooditem_id is not None and cart.remove(fooditem_id)
+            except CartBusy:
+                return JsonResponse({'status': 'Failed', 'message': CART_BUSY_MESSAGE})
+            if not removed:
                 return JsonResponse({'status': 'Failed', 'message': 'Cart Item does not exist!'})
+            return cart_response(cart, 0, message='Cart item has been deleted!')
         else:
             return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
 
@@ -142,29 +158,53 @@ def search(request):
         return redirect('marketplace')
     else:
         address = request.GET['address']
-        latitude = request.GET['lat']
-        longitude = request.GET['lng']
-        radius = request.GET['radius']
-        keyword = request.GET['keyword']
-
-        # get vendor ids that has the food item the user is looking for
-        fetch_vendors_by_fooditems = FoodItem.objects.filter(food_title__icontains=keyword, is_available=True).values_list('vendor', flat=True)
-        
-        vendors = Vendor.objects.filter(Q(id__in=fetch_vendors_by_fooditems) | Q(vendor_name__icontains=keyword, is_approved=True, user__is_active=True))
-        if latitude and longitude and radius:
-            pnt = GEOSGeometry('POINT(%s %s)' % (longitude, latitude))
+        latitude = request.GET.get('lat')
+        longitude = request.GET.get('lng')
+        radius = request.GET.get('radius')
+        keyword = request.GET.get('keyword', '').strip()
 
-            vendors = Vendor.objects.filter(Q(id__in=fetch_vendors_by_fooditems) | Q(vendor_name__icontains=keyword, is_approved=True, user__is_active=True),
-            user_profile__location__distance_lte=(pnt, D(km=radius))
-            ).annotate(distance=Distance("user_profile__location", pnt)).order_by("distance")
+        open_now, open_now_query = open_now_param(request)
 
-            for v in vendors:
-                v.kms = round(v.distance.km, 1)
-        vendor_count = vendors.count()
+        results = None
+        if latitude and longitude and radius:
+            # Shared by the visitors of a geohash cell, see marketplace.geocells
+            results = search_nearby(keyword, float(longitude), float(latitude), float(radius))
+
+        if results is not None:
+            if open_now:
+                open_ids = open_vendor_ids(vendor_id for vendor_id, meters in results)
+                results = [result for result in results if result[0] in open_ids]
+            page = Paginator(results, PAGE_SIZE).get_page(request.GET.get('page'))
+            page.object_list = load_vendors(page.object_list)
+        else:
+            # Vendors ranked by their best matching food item or their name
+            vendors = search_vendors(keyword)
+            ordering = ['-rank', 'id']
+            if latitude and longitude and radius:
+                pnt = GEOSGeometry('POINT(%s %s)' % (longitude, latitude))
+                vendors = vendors.filter(
+                    user_profile__location__distance_lte=(pnt, D(km=radius))
+                ).annotate(distance=Distance("user_profile__location", pnt))
+                ordering = ['-rank', 'distance', 'id']
+            if open_now:
+                vendors = vendors.open_at(timezone.now())
+
+            page = Paginator(vendors.order_by(*ordering), PAGE_SIZE).get_page(request.GET.get('page'))
+            for v in page:
+                if hasattr(v, 'distance'):
+                    v.kms = round(v.distance.km, 1)
+        set_open_status(page)
+
+        # Query string of the other pages
+        params = request.GET.copy()
+        params.pop('page', None)
         context = {
-            'vendors': vendors,
-            'vendor_count': vendor_count,
+            'vendors': page,
+            'vendor_count': page.paginator.count,
             'source_location': address,
+            'page_query': params.urlencode(),
+            'open_now': open_now,
+            'open_now_query': open_now_query,
         }
 
 
@@ -173,6 +213,11 @@ def search(request):
 
 @login_required(login_url='login')
 def checkout(request):
+    try:
+        SessionCart.for_request(request).flush()
+    except CartBusy:
+        messages.error(request, CART_BUSY_MESSAGE)
+        return redirect('cart')
     cart_items = Cart.objects.filter(user=request.user).order_by('created_at')
     cart_count = cart_items.count()
     if cart_count <= 0:
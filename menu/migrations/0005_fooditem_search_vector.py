@@ -0,0 +1,87 @@
+# Generated by Django 4.0.3 on 2026-10-19 17:05
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# The search vector of a food item is rebuilt on every insert and on
+# updates of its searchable columns; renaming a category or a vendor
+# rebuilds the vectors of their food items.
+SEARCH_TRIGGERS = """
+CREATE FUNCTION menu_fooditem_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.food_title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce((SELECT category_name FROM menu_category WHERE id = NEW.category_id), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce((SELECT vendor_name FROM vendor_vendor WHERE id = NEW.vendor_id), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER menu_fooditem_search_vector
+    BEFORE INSERT OR UPDATE OF food_title, description, category_id, vendor_id, search_vector ON menu_fooditem
+    FOR EACH ROW EXECUTE FUNCTION menu_fooditem_search_vector();
+
+CREATE FUNCTION menu_category_search_vector() RETURNS trigger AS $$
+BEGIN
+    UPDATE menu_fooditem SET search_vector = NULL WHERE category_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER menu_category_search_vector
+    AFTER UPDATE OF category_name ON menu_category
+    FOR EACH ROW WHEN (OLD.category_name IS DISTINCT FROM NEW.category_name)
+    EXECUTE FUNCTION menu_category_search_vector();
+
+CREATE FUNCTION vendor_vendor_search_vector() RETURNS trigger AS $$
+BEGIN
+    UPDATE menu_fooditem SET search_vector = NULL WHERE vendor_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER vendor_vendor_search_vector
+    AFTER UPDATE OF vendor_name ON vendor_vendor
+    FOR EACH ROW WHEN (OLD.vendor_name IS DISTINCT FROM NEW.vendor_name)
+    EXECUTE FUNCTION vendor_vendor_search_vector();
+
+-- Fills search_vector of the existing rows through the trigger
+UPDATE menu_fooditem SET search_vector = NULL;
+"""
+
+DROP_SEARCH_TRIGGERS = """
+DROP TRIGGER vendor_vendor_search_vector ON vendor_vendor;
+DROP FUNCTION vendor_vendor_search_vector();
+DROP TRIGGER menu_category_search_vector ON menu_category;
+DROP FUNCTION menu_category_search_vector();
+DROP TRIGGER menu_fooditem_search_vector ON menu_fooditem;
+DROP FUNCTION menu_fooditem_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0004_alter_category_category_name'),
+        ('vendor', '0006_vendor_name_trgm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fooditem',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_TRIGGERS, DROP_SEARCH_TRIGGERS),
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='menu_fooditem_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['food_title'], name='menu_fooditem_title_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
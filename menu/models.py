@@ -1,4 +1,6 @@
 from tabnanny import verbose
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from vendor.models import Vendor
 
@@ -31,8 +33,17 @@ class FoodItem(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to='foodimages')
     is_available = models.BooleanField(default=True)
+    # Title, category and vendor name and description; maintained by a
+    # database trigger, see marketplace.search
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='menu_fooditem_search_idx'),
+            GinIndex(fields=['food_title'], name='menu_fooditem_title_trgm', opclasses=['gin_trgm_ops']),
+        ]
+
     def __str__(self):
         return self.food_title
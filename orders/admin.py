@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment, Order, OrderedFood
+from .models import Payment, Order, OrderedFood, OrderVendorTotal, VendorDailyRevenue, VendorMonthlyRevenue
 
 
 class OrderedFoodInline(admin.TabularInline):
@@ -8,11 +8,26 @@ class OrderedFoodInline(admin.TabularInline):
     extra = 0
 
 
+class OrderVendorTotalInline(admin.TabularInline):
+    model = OrderVendorTotal
+    readonly_fields = ('vendor', 'subtotal', 'tax_data', 'total_tax', 'grand_total')
+    extra = 0
+
+
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['order_number', 'name', 'phone', 'email', 'total', 'payment_method', 'status', 'order_placed_to', 'is_ordered']
-    inlines = [OrderedFoodInline]
+    inlines = [OrderedFoodInline, OrderVendorTotalInline]
 
 
 admin.site.register(Payment)
 admin.site.register(Order, OrderAdmin)
 admin.site.register(OrderedFood)
+
+
+class VendorRevenueAdmin(admin.ModelAdmin):
+    list_display = ['vendor', 'revenue', 'order_count']
+    list_filter = ['vendor']
+
+
+admin.site.register(VendorDailyRevenue, VendorRevenueAdmin)
+admin.site.register(VendorMonthlyRevenue, VendorRevenueAdmin)
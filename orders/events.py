@@ -0,0 +1,311 @@
+"""
+Push channel that tells vendors about new orders as soon as they are
+finalized.
+
+finalize_order publishes a short summary per vendor. On PostgreSQL the
+summary goes through NOTIFY, which is only delivered when the transaction
+commits, so every ASGI process sees it; each process keeps one LISTEN
+connection and fans the events out to its subscribers. On other databases
+the events stay in the publishing process.
+
+vendor_events_app is a plain ASGI app (routed in dishonline_main/asgi.py)
+serving the events as server-sent events, or as a long-poll JSON response
+with ``?poll=1``. An idle subscriber is just an asyncio.Queue, so a single
+process can hold thousands of open connections.
+
+Each event carries the id of its order's OrderReceipt, written when the
+order is finalized. A client resumes from the last id it saw (the
+Last-Event-ID header of an EventSource, ``last_id`` of a long poll), and
+the orders finalized since then are replayed from the database, so the
+events published while it was reconnecting are not lost.
+"""
+
+import asyncio
+import logging
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+import simplejson as json
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'vendor_orders'
+VENDOR_EVENTS_PATH = '/vendor/events/'
+HEARTBEAT_INTERVAL = 15
+LONG_POLL_TIMEOUT = 25
+# Most missed events replayed to a resuming client
+MAX_REPLAYED_EVENTS = 100
+
+
+def order_event(order, vendor_total, receipt_id):
+    return {
+        'id': receipt_id,
+        'vendor_id': vendor_total.vendor_id,
+        'order_number': order.order_number,
+        'name': order.name,
+        'grand_total': vendor_total.grand_total,
+        'status': order.status,
+        'created_at': order.created_at.isoformat(),
+    }
+
+
+def publish_order(order):
+    """Publish a summary of a finalized order to each of its vendors"""
+    receipt_id = order.receipt.id
+    for vendor_total in order.vendor_totals.all():
+        payload = json.dumps(order_event(order, vendor_total, receipt_id))
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, payload])
+        else:
+            transaction.on_commit(lambda payload=payload: broker.publish(payload))
+
+
+class Broker:
+    """In-process fan-out of order events to the subscribed vendors"""
+
+    def __init__(self):
+        self.subscribers = {}
+        self.loop = None
+        self.listener = None
+
+    def subscribe(self, vendor_id):
+        self.loop = asyncio.get_running_loop()
+        if connection.vendor == 'postgresql' and self.listener is None:
+            self.listener = self.loop.create_task(self.listen())
+        queue = asyncio.Queue()
+        self.subscribers.setdefault(vendor_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, vendor_id, queue):
+        queues = self.subscribers.get(vendor_id, set())
+        queues.discard(queue)
+        if not queues:
+            self.subscribers.pop(vendor_id, None)
+
+    def publish(self, payload):
+        # May be called from a worker thread (e.g. transaction.on_commit)
+        if self.loop is None:
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            self.dispatch(payload)
+        else:
+            self.loop.call_soon_threadsafe(self.dispatch, payload)
+
+    def dispatch(self, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        for queue in self.subscribers.get(event.get('vendor_id'), ()):
+            queue.put_nowait(event)
+
+    async def listen(self):
+        """Keep one LISTEN connection per process and feed its notifications to the subscribers"""
+        while True:
+            try:
+                pg_connection = await sync_to_async(self.connect, thread_sensitive=False)()
+            except Exception:
+                logger.exception('Could not open the %s listener connection', CHANNEL)
+                await asyncio.sleep(5)
+                continue
+
+            notified = asyncio.Event()
+            self.loop.add_reader(pg_connection.fileno(), notified.set)
+            try:
+                while True:
+                    await notified.wait()
+                    notified.clear()
+                    pg_connection.poll()
+                    while pg_connection.notifies:
+                        self.dispatch(pg_connection.notifies.pop(0).payload)
+            except Exception:
+                logger.exception('The %s listener connection failed, reconnecting', CHANNEL)
+            finally:
+                self.loop.remove_reader(pg_connection.fileno())
+                pg_connection.close()
+            await asyncio.sleep(1)
+
+    @staticmethod
+    def connect():
+        pg_connection = connection.get_new_connection(connection.get_connection_params())
+        pg_connection.autocommit = True
+        with pg_connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+        return pg_connection
+
+
+broker = Broker()
+
+
+def _get_vendor_id(session_key):
+    from django.contrib.auth import get_user
+    from vendor.models import Vendor
+
+    close_old_connections()
+    try:
+        session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+        user = get_user(SimpleNamespace(session=session))
+        if not user.is_authenticated:
+            return None
+        return Vendor.objects.filter(user=user).values_list('id', flat=True).first()
+    finally:
+        close_old_connections()
+
+
+def _missed_events(vendor_id, last_id):
+    """The events of the vendor's orders finalized after receipt ``last_id``, oldest first"""
+    from .models import OrderVendorTotal
+
+    close_old_connections()
+    try:
+        vendor_totals = (
+            OrderVendorTotal.objects
+            .filter(vendor_id=vendor_id, order__receipt__id__gt=last_id)
+            .select_related('order__receipt')
+            .order_by('order__receipt__id')[:MAX_REPLAYED_EVENTS]
+        )
+        return [order_event(vendor_total.order, vendor_total, vendor_total.order.receipt.id) for vendor_total in vendor_totals]
+    finally:
+        close_old_connections()
+
+
+def _latest_event_id(vendor_id):
+    """The id of the vendor's newest event, where a fresh client starts from"""
+    from .models import OrderReceipt
+
+    close_old_connections()
+    try:
+        latest = OrderReceipt.objects.filter(order__vendor_totals__vendor_id=vendor_id).order_by('-id').values_list('id', flat=True).first()
+        return latest or 0
+    finally:
+        close_old_connections()
+
+
+def _get_last_id(scope, query):
+    """The id of the last event the client saw, None for a fresh client"""
+    values = query.get('last_id') or [
+        value.decode('latin-1') for key, value in scope['headers'] if key == b'last-event-id'
+    ]
+    try:
+        return int(values[0])
+    except (IndexError, ValueError):
+        return None
+
+
+def _get_cookie(scope, name):
+    for key, value in scope['headers']:
+        if key == b'cookie':
+            for cookie in value.decode('latin-1').split(';'):
+                cookie_name, _, cookie_value = cookie.strip().partition('=')
+                if cookie_name == name:
+                    return cookie_value
+    return None
+
+
+async def _send_response(send, status, body, content_type=b'application/json'):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type), (b'cache-control', b'no-cache')],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def vendor_events_app(scope, receive, send):
+    session_key = _get_cookie(scope, settings.SESSION_COOKIE_NAME)
+    vendor_id = await sync_to_async(_get_vendor_id)(session_key) if session_key else None
+    if vendor_id is None:
+        await _send_response(send, 403, b'{"status": "login_required"}')
+        return
+
+    query = parse_qs(scope.get('query_string', b'').decode())
+    long_poll = query.get('poll') == ['1']
+    last_id = _get_last_id(scope, query)
+    # Subscribe before reading the missed events, so none falls in between
+    queue = broker.subscribe(vendor_id)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        if last_id is None:
+            missed, last_id = [], await sync_to_async(_latest_event_id)(vendor_id)
+        else:
+            missed = await sync_to_async(_missed_events)(vendor_id, last_id)
+        if long_poll:
+            await _long_poll(send, queue, disconnected, missed, last_id)
+        else:
+            await _stream(send, queue, disconnected, missed, last_id)
+    finally:
+        disconnected.cancel()
+        broker.unsubscribe(vendor_id, queue)
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _next_event(queue, disconnected, timeout):
+    """Wait for the next event; returns None on timeout or disconnect"""
+    getter = asyncio.ensure_future(queue.get())
+    done, _ = await asyncio.wait([getter, disconnected], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    if getter in done:
+        return getter.result()
+    getter.cancel()
+    return None
+
+
+def _sse_event(event):
+    return f'id: {event["id"]}\nevent: order\ndata: {json.dumps(event)}\n\n'.encode()
+
+
+async def _stream(send, queue, disconnected, missed, last_id):
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+    # The bare id sets the client's Last-Event-ID before its first event
+    body = f'retry: 5000\nid: {last_id}\n\n'.encode() + b''.join(_sse_event(event) for event in missed)
+    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    replayed = {event['id'] for event in missed}
+    while not disconnected.done():
+        event = await _next_event(queue, disconnected, HEARTBEAT_INTERVAL)
+        if event is None:
+            if disconnected.done():
+                break
+            body = b': keep-alive\n\n'
+        elif event['id'] in replayed:
+            continue
+        else:
+            body = _sse_event(event)
+        await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def _long_poll(send, queue, disconnected, missed, last_id):
+    events = missed
+    if not events:
+        event = await _next_event(queue, disconnected, LONG_POLL_TIMEOUT)
+        if event is not None:
+            events.append(event)
+    while not queue.empty():
+        events.append(queue.get_nowait())
+
+    # An event can be both replayed and queued
+    unique_events = list({event['id']: event for event in events}.values())
+    last_id = max([last_id] + [event['id'] for event in unique_events])
+    if not disconnected.done():
+        await _send_response(send, 200, json.dumps({'events': unique_events, 'last_id': last_id}).encode())
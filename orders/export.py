@@ -0,0 +1,90 @@
+import csv
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+import simplejson as json
+
+from .models import OrderedFood
+
+
+EXPORT_FIELDS = [
+    'order_number', 'created_at', 'status', 'first_name', 'last_name', 'email', 'phone',
+    'food_title', 'quantity', 'price', 'amount',
+]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def vendor_order_rows(vendor, date_from=None, date_to=None, chunk_size=2000):
+    """
+    Yield one dict per ordered food line of the vendor, oldest first.
+
+    Rows are read through a server-side cursor in chunks, so memory use does
+    not depend on the number of rows exported.
+    """
+    lines = OrderedFood.objects.filter(fooditem__vendor=vendor, order__is_ordered=True)
+    if date_from:
+        lines = lines.filter(order__created_at__gte=timezone.make_aware(datetime.combine(date_from, time.min)))
+    if date_to:
+        lines = lines.filter(order__created_at__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min)))
+
+    values = lines.order_by('order__created_at', 'id').values_list(
+        'order__order_number', 'order__created_at', 'order__status', 'order__first_name', 'order__last_name',
+        'order__email', 'order__phone', 'fooditem__food_title', 'quantity', 'price', 'amount',
+    )
+    for row in values.iterator(chunk_size=chunk_size):
+        row = dict(zip(EXPORT_FIELDS, row))
+        row['created_at'] = timezone.localtime(row['created_at']).isoformat()
+        yield row
+
+
+class Echo:
+    """File-like object that returns what is written, for streaming csv.writer output"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.DictWriter(Echo(), fieldnames=EXPORT_FIELDS)
+    yield writer.writerow(dict(zip(EXPORT_FIELDS, EXPORT_FIELDS)))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+def export_chunks(rows, format='csv', compress=False, buffer_size=64 * 1024):
+    """
+    Encode ``rows`` as CSV or NDJSON and yield bytes in chunks of roughly
+    ``buffer_size``, optionally gzip-compressed on the fly.
+    """
+    lines = csv_lines(rows) if format == 'csv' else ndjson_lines(rows)
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 writes a gzip header
+
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= buffer_size:
+            chunk = ''.join(buffer).encode()
+            buffer = []
+            size = 0
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+
+    chunk = ''.join(buffer).encode()
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
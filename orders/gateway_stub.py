@@ -0,0 +1,275 @@
+"""
+Local stand-in for the SSLCommerz and Stripe APIs, used by integration and
+load tests through ``python manage.py run_gateway_stub``.
+
+It implements the calls made by orders/gateways.py:
+
+    POST /gwprocess/v4/api.php                              SSLCommerz session
+    GET  /gwprocess/v4/pay/?tran_id=...                     hosted payment page
+    GET  /validator/api/validationserverAPI.php             val_id validation
+    GET  /validator/api/merchantTransIDvalidationAPI.php    tran_id query
+    POST /v1/checkout/sessions                              Stripe checkout session
+    GET  /v1/checkout/sessions/<id>                         Stripe session lookup
+    GET  /stripe/pay/<id>                                   hosted payment page
+
+The hosted pages pay immediately and send the browser back to the
+success url. When a Stripe webhook url and secret are given, the paid
+session is also delivered as a signed ``checkout.session.completed`` event.
+``latency`` and ``failure_rate`` simulate a slow or flaky gateway.
+
+checkout_completed_event() and stripe_signature_header() build locally
+signed webhook fixtures (see ``manage.py send_stripe_test_event``).
+"""
+
+import hashlib
+import hmac
+import html
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import Request, urlopen
+
+
+def checkout_completed_event(session):
+    """A Stripe ``checkout.session.completed`` event for ``session`` (a dict)"""
+    return {
+        'id': f'evt_test_{uuid.uuid4().hex}',
+        'object': 'event',
+        'api_version': '2020-08-27',
+        'created': int(time.time()),
+        'livemode': False,
+        'type': 'checkout.session.completed',
+        'data': {'object': session},
+    }
+
+
+def stripe_signature_header(payload, secret, timestamp=None):
+    """Stripe-Signature header value for ``payload`` (the raw request body)"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+def send_stripe_event(url, event, secret):
+    """POST a signed event to a webhook url; returns the HTTP status"""
+    payload = json.dumps(event)
+    request = Request(url, data=payload.encode(), method='POST', headers={
+        'Content-Type': 'application/json',
+        'Stripe-Signature': stripe_signature_header(payload, secret),
+    })
+    with urlopen(request, timeout=10) as response:
+        return response.status
+
+
+class StubState:
+    def __init__(self, latency=0, failure_rate=0, webhook_url=None, webhook_secret=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.sslcommerz = {}  # tran_id -> transaction
+        self.stripe = {}  # session id -> checkout session
+        self.lock = threading.Lock()
+
+
+class GatewayStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real gateways
+
+    @property
+    def state(self):
+        return self.server.state
+
+    @property
+    def base_url(self):
+        return f'http://{self.headers.get("Host")}'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def handle_request(self, method):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if method == 'POST':
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length).decode()
+            params.update({key: values[-1] for key, values in parse_qs(body).items()})
+
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        if random.random() < self.state.failure_rate:
+            return self.send_json({'error': 'stub failure'}, status=503)
+
+        routes = {
+            ('POST', '/gwprocess/v4/api.php'): self.sslcommerz_session,
+            ('GET', '/gwprocess/v4/pay/'): self.sslcommerz_pay,
+            ('GET', '/validator/api/validationserverAPI.php'): self.sslcommerz_validate,
+            ('GET', '/validator/api/merchantTransIDvalidationAPI.php'): self.sslcommerz_query,
+            ('POST', '/v1/checkout/sessions'): self.stripe_create_session,
+        }
+        handler = routes.get((method, url.path))
+        if handler:
+            return handler(params)
+        if url.path.startswith('/v1/checkout/sessions/') and method == 'GET':
+            return self.stripe_retrieve_session(url.path.rsplit('/', 1)[-1])
+        if url.path.startswith('/stripe/pay/') and method == 'GET':
+            return self.stripe_pay(url.path.rsplit('/', 1)[-1])
+        self.send_json({'error': 'not found'}, status=404)
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_html(self, content, status=200):
+        body = content.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def redirect(self, location):
+        self.send_response(302)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    # SSLCommerz
+
+    def sslcommerz_session(self, params):
+        tran_id = params.get('tran_id')
+        if not tran_id or not params.get('total_amount'):
+            return self.send_json({'status': 'FAILED', 'failedreason': 'tran_id and total_amount are required'})
+        with self.state.lock:
+            self.state.sslcommerz[tran_id] = {
+                'tran_id': tran_id,
+                'val_id': None,
+                'amount': params['total_amount'],
+                'currency': params.get('currency', 'BDT'),
+                'status': 'PENDING',
+                'success_url': params.get('success_url'),
+                'ipn_url': params.get('ipn_url'),
+            }
+        return self.send_json({
+            'status': 'SUCCESS',
+            'sessionkey': uuid.uuid4().hex,
+            'GatewayPageURL': f'{self.base_url}/gwprocess/v4/pay/?{urlencode({"tran_id": tran_id})}',
+        })
+
+    def sslcommerz_pay(self, params):
+        with self.state.lock:
+            transaction = self.state.sslcommerz.get(params.get('tran_id'))
+            if transaction is None:
+                return self.send_json({'error': 'unknown tran_id'}, status=404)
+            if transaction['val_id'] is None:
+                transaction['val_id'] = uuid.uuid4().hex[:16]
+                transaction['status'] = 'VALID'
+        # The real gateway POSTs the result back to the success url
+        fields = ''.join(
+            f'<input type="hidden" name="{name}" value="{html.escape(str(transaction[name]))}">'
+            for name in ('tran_id', 'val_id', 'amount', 'currency', 'status')
+        )
+        return self.send_html(
+            f'<form method="post" action="{html.escape(transaction["success_url"] or "")}">{fields}</form>'
+            '<script>document.forms[0].submit()</script>'
+        )
+
+    def sslcommerz_validate(self, params):
+        with self.state.lock:
+            transaction = next((t for t in self.state.sslcommerz.values() if t['val_id'] == params.get('val_id')), None)
+        if transaction is None:
+            return self.send_json({'status': 'INVALID_TRANSACTION'})
+        return self.send_json({key: transaction[key] for key in ('status', 'tran_id', 'val_id', 'amount', 'currency')})
+
+    def sslcommerz_query(self, params):
+        with self.state.lock:
+            transaction = self.state.sslcommerz.get(params.get('tran_id'))
+        elements = []
+        if transaction and transaction['val_id']:
+            elements.append({key: transaction[key] for key in ('status', 'tran_id', 'val_id', 'amount', 'currency')})
+        return self.send_json({'APIConnect': 'DONE', 'no_of_trans_found': len(elements), 'element': elements})
+
+    # Stripe
+
+    def stripe_create_session(self, params):
+        session_id = f'cs_test_{uuid.uuid4().hex}'
+        amount_total = 0
+        for key, value in params.items():
+            if key.startswith('line_items[') and key.endswith('[price_data][unit_amount]'):
+                index = key[len('line_items['):key.index(']')]
+                amount_total += int(value) * int(params.get(f'line_items[{index}][quantity]', 1))
+        session = {
+            'id': session_id,
+            'object': 'checkout.session',
+            'mode': params.get('mode', 'payment'),
+            'payment_status': 'unpaid',
+            'status': 'open',
+            'payment_intent': None,
+            'amount_total': amount_total,
+            'success_url': params.get('success_url', '').replace('{CHECKOUT_SESSION_ID}', session_id),
+            'cancel_url': params.get('cancel_url'),
+            'metadata': {
+                key[len('metadata['):-1]: value for key, value in params.items() if key.startswith('metadata[')
+            },
+            'url': f'{self.base_url}/stripe/pay/{session_id}',
+        }
+        with self.state.lock:
+            self.state.stripe[session_id] = session
+        return self.send_json(session)
+
+    def stripe_retrieve_session(self, session_id):
+        with self.state.lock:
+            session = self.state.stripe.get(session_id)
+        if session is None:
+            return self.send_json({'error': {'type': 'invalid_request_error', 'message': 'No such checkout.session'}}, status=404)
+        return self.send_json(session)
+
+    def stripe_pay(self, session_id):
+        with self.state.lock:
+            session = self.state.stripe.get(session_id)
+            if session is None:
+                return self.send_json({'error': 'unknown session'}, status=404)
+            paid_now = session['payment_status'] != 'paid'
+            if paid_now:
+                session.update(payment_status='paid', status='complete', payment_intent=f'pi_{uuid.uuid4().hex[:24]}')
+        if paid_now and self.state.webhook_url:
+            threading.Thread(target=self.deliver_webhook, args=(dict(session),), daemon=True).start()
+        return self.redirect(session['success_url'])
+
+    def deliver_webhook(self, session):
+        try:
+            send_stripe_event(self.state.webhook_url, checkout_completed_event(session), self.state.webhook_secret)
+        except OSError as e:
+            self.log_error('Webhook delivery to %s failed: %s', self.state.webhook_url, e)
+
+
+class GatewayStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # load tests open many connections at once
+
+    def handle_error(self, request, client_address):
+        # Clients giving up on a slow response are expected under --latency
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def make_server(host='127.0.0.1', port=8002, latency=0, failure_rate=0, verbose=False, webhook_url=None, webhook_secret=None):
+    server = GatewayStubServer((host, port), GatewayStubHandler)
+    server.state = StubState(latency, failure_rate, webhook_url, webhook_secret)
+    server.verbose = verbose
+    return server
@@ -0,0 +1,292 @@
+"""
+HTTP clients for the payment gateways.
+
+Each gateway gets one pooled requests.Session (keep-alive connections are
+reused across requests of the same worker), explicit connect/read timeouts,
+bounded retries for idempotent calls and a circuit breaker, so a slow or
+failing gateway fails fast instead of pinning the workers. Every call is
+timed and counted; see ``gateway_metrics()``.
+
+The async views use the ``a*`` methods, which go through a pooled
+httpx.AsyncClient with the same timeouts, circuit breaker and metrics.
+
+The base URLs come from the settings, so pointing SSLCOMMERZ_BASE_URL and
+STRIPE_API_BASE at ``manage.py run_gateway_stub`` runs the whole payment
+flow offline.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+import stripe
+from urllib3.util.retry import Retry
+
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayError(Exception):
+    """The gateway could not be reached or returned an unusable response"""
+
+
+class CircuitOpenError(GatewayError):
+    """The gateway failed too often recently and calls are short-circuited"""
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and rejects calls
+    for ``reset_timeout`` seconds, then lets a single trial call through.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class GatewayMetrics:
+    """Request counters and recent latencies of one gateway"""
+
+    def __init__(self, sample_size=500):
+        self.requests = 0
+        self.failures = 0
+        self.short_circuited = 0
+        self.latencies = deque(maxlen=sample_size)
+        self.lock = threading.Lock()
+
+    def record(self, elapsed_ms, failed):
+        with self.lock:
+            self.requests += 1
+            self.failures += failed
+            self.latencies.append(elapsed_ms)
+
+    def record_short_circuit(self):
+        with self.lock:
+            self.short_circuited += 1
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            snapshot = {
+                'requests': self.requests,
+                'failures': self.failures,
+                'short_circuited': self.short_circuited,
+            }
+        if latencies:
+            snapshot.update({
+                'p50_ms': round(latencies[len(latencies) // 2], 1),
+                'p95_ms': round(latencies[int(len(latencies) * 0.95)], 1),
+                'max_ms': round(latencies[-1], 1),
+            })
+        return snapshot
+
+
+def describe_error(exception):
+    """Name of the underlying error; the message would leak the query string (credentials)"""
+    reason = getattr(exception.args[0], 'reason', None) if exception.args else None
+    return type(reason or exception).__name__
+
+
+class GatewayClient:
+    def __init__(self, name, base_url, retries=None):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (settings.PAYMENT_GATEWAY_CONNECT_TIMEOUT, settings.PAYMENT_GATEWAY_READ_TIMEOUT)
+        self.breaker = CircuitBreaker(settings.PAYMENT_GATEWAY_FAILURE_THRESHOLD, settings.PAYMENT_GATEWAY_RESET_TIMEOUT)
+        self.metrics = GatewayMetrics()
+
+        # Connection errors are always retried; read errors and 5xx
+        # responses only for idempotent methods (POST is not retried)
+        retry = Retry(
+            total=settings.PAYMENT_GATEWAY_RETRIES if retries is None else retries,
+            backoff_factor=0.2,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.PAYMENT_GATEWAY_POOL_SIZE,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.retries = retry.total
+        self.async_client = None
+        self.async_loop = None
+
+    def check_circuit(self):
+        if not self.breaker.allow():
+            self.metrics.record_short_circuit()
+            raise CircuitOpenError(f'{self.name} circuit is open')
+
+    def record(self, method, url, started, status=None, error=None):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        failed = error is not None or (status is not None and status >= 500)
+        if failed:
+            self.breaker.record_failure()
+            logger.warning('%s %s %s failed in %.0fms: %s', self.name, method, url, elapsed_ms, error or status)
+        else:
+            self.breaker.record_success()
+            logger.info('%s %s %s %s in %.0fms', self.name, method, url, status, elapsed_ms)
+        self.metrics.record(elapsed_ms, failed)
+
+    def request(self, method, path, **kwargs):
+        """Send a request and return the decoded JSON body; raises GatewayError"""
+        url = f'{self.base_url}{path}'
+        self.check_circuit()
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            error = describe_error(e)
+            self.record(method, url, started, error=error)
+            raise GatewayError(f'{self.name} request failed: {error}') from e
+        self.record(method, url, started, status=response.status_code)
+
+        return self.decode(response)
+
+    def get_async_client(self):
+        # An httpx client is bound to the event loop it was first used on
+        loop = asyncio.get_running_loop()
+        if self.async_loop is not loop:
+            self.async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(max_connections=settings.PAYMENT_GATEWAY_ASYNC_POOL_SIZE),
+                transport=httpx.AsyncHTTPTransport(retries=self.retries),  # connection errors only
+            )
+            self.async_loop = loop
+        return self.async_client
+
+    async def arequest(self, method, path, **kwargs):
+        """Async version of request(), for the ASGI views"""
+        url = f'{self.base_url}{path}'
+        self.check_circuit()
+        started = time.perf_counter()
+        try:
+            response = await self.get_async_client().request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+            self.record(method, url, started, error=error)
+            raise GatewayError(f'{self.name} request failed: {error}') from e
+        self.record(method, url, started, status=response.status_code)
+        return self.decode(response)
+
+    def decode(self, response):
+        if response.status_code >= 400:
+            raise GatewayError(f'{self.name} returned HTTP {response.status_code}')
+        try:
+            return response.json()
+        except ValueError as e:
+            raise GatewayError(f'{self.name} returned invalid JSON') from e
+
+
+class SSLCommerzClient(GatewayClient):
+    def __init__(self):
+        super().__init__('SSLCommerz', settings.SSLCOMMERZ_BASE_URL)
+
+    def credentials(self):
+        return {
+            'store_id': settings.SSLCOMMERZ_STORE_ID,
+            'store_passwd': settings.SSLCOMMERZ_STORE_PASSWORD,
+        }
+
+    def init_payment(self, data):
+        """Create a payment session; returns the gateway response"""
+        return self.request('POST', '/gwprocess/v4/api.php', data={**self.credentials(), **data})
+
+    def validate(self, val_id):
+        """Validate the val_id posted back to the success/IPN urls"""
+        params = {**self.credentials(), 'val_id': val_id, 'format': 'json'}
+        return self.request('GET', '/validator/api/validationserverAPI.php', params=params)
+
+    async def avalidate(self, val_id):
+        params = {**self.credentials(), 'val_id': val_id, 'format': 'json'}
+        return await self.arequest('GET', '/validator/api/validationserverAPI.php', params=params)
+
+    def query_transaction(self, tran_id):
+        """Look up the payments made for a transaction id (our order number)"""
+        params = {**self.credentials(), 'tran_id': tran_id, 'format': 'json'}
+        return self.request('GET', '/validator/api/merchantTransIDvalidationAPI.php', params=params)
+
+
+class StripeHTTPClient(stripe.RequestsClient):
+    """stripe-python HTTP client going through the pooled session and circuit breaker"""
+
+    def __init__(self, gateway):
+        super().__init__(timeout=gateway.timeout, session=gateway.session)
+        self.gateway = gateway
+
+    def request(self, method, url, headers, post_data=None):
+        try:
+            self.gateway.check_circuit()
+        except CircuitOpenError as e:
+            raise stripe.APIConnectionError(str(e))
+        started = time.perf_counter()
+        try:
+            content, status, response_headers = super().request(method, url, headers, post_data)
+        except stripe.APIConnectionError as e:
+            self.gateway.record(method.upper(), url, started, error=type(e).__name__)
+            raise
+        self.gateway.record(method.upper(), url, started, status=status)
+        return content, status, response_headers
+
+
+sslcommerz = SSLCommerzClient()
+# stripe-python retries by itself, with idempotency keys, so the adapter must not
+stripe_gateway = GatewayClient('Stripe', settings.STRIPE_API_BASE, retries=0)
+
+
+def configure_stripe():
+    """Point stripe-python at the pooled client (called from OrdersConfig.ready)"""
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.api_base = stripe_gateway.base_url
+    stripe.max_network_retries = settings.PAYMENT_GATEWAY_RETRIES
+    stripe.default_http_client = StripeHTTPClient(stripe_gateway)
+
+
+def gateway_metrics():
+    return {client.name: client.metrics.snapshot() for client in (sslcommerz, stripe_gateway)}
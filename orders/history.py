@@ -0,0 +1,113 @@
+import base64
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Order, OrderVendorTotal
+
+
+PAGE_SIZE = 25
+
+OrderPage = namedtuple('OrderPage', ['orders', 'next_cursor'])
+
+
+def customer_order_history(user):
+    return Order.objects.filter(user=user, is_ordered=True)
+
+
+def vendor_order_history(vendor):
+    """
+    The vendor's OrderVendorTotal rows of placed orders. The vendor history
+    is paged on them, which orders_vendor_history_idx (vendor, created_at,
+    id) serves; vendor_orders() turns a page into orders.
+    """
+    return OrderVendorTotal.objects.filter(vendor=vendor, order__is_ordered=True).select_related('order')
+
+
+def vendor_orders(vendor_totals):
+    """The orders of ``vendor_totals``, each with the vendor's own ``vendor_grand_total``"""
+    orders = []
+    for vendor_total in vendor_totals:
+        order = vendor_total.order
+        order.vendor_grand_total = vendor_total.grand_total
+        orders.append(order)
+    return orders
+
+
+def parse_date_param(value):
+    """The date of a YYYY-MM-DD parameter; None when missing, malformed or impossible (2024-02-31)"""
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+def filter_order_history(orders, params, amount_field='total', status_field='status'):
+    """
+    Apply the history filters found in ``params`` (usually request.GET):
+    date_from, date_to (YYYY-MM-DD), status, min_amount and max_amount.
+    """
+    # Datetime bounds, so the (…, created_at, id) history indexes serve the range
+    date_from = parse_date_param(params.get('date_from'))
+    if date_from:
+        orders = orders.filter(created_at__gte=timezone.make_aware(datetime.combine(date_from, time.min)))
+    date_to = parse_date_param(params.get('date_to'))
+    if date_to:
+        orders = orders.filter(created_at__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min)))
+    status = params.get('status')
+    if status:
+        orders = orders.filter(**{status_field: status})
+    for param, lookup in (('min_amount', 'gte'), ('max_amount', 'lte')):
+        try:
+            amount = float(params.get(param) or '')
+        except ValueError:
+            continue
+        orders = orders.filter(**{f'{amount_field}__{lookup}': amount})
+    return orders
+
+
+def paginate_order_history(orders, cursor=None, page_size=PAGE_SIZE):
+    """
+    Return one page of orders (or vendor totals), newest first, using keyset
+    pagination on (created_at, id) so that every page costs the same as the
+    first one.
+    """
+    orders = orders.order_by('-created_at', '-id')
+    position = decode_cursor(cursor)
+    if position:
+        created_at, pk = position
+        orders = orders.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    page = list(orders[:page_size + 1])
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_cursor(page[-1])
+    return OrderPage(page, next_cursor)
+
+
+def next_page_query(request, page):
+    """Query string of the next page, keeping the current filters"""
+    if not page.next_cursor:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = page.next_cursor
+    return params.urlencode()
+
+
+def encode_cursor(order):
+    value = f'{order.created_at.isoformat()}|{order.pk}'
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except ValueError:
+        return None
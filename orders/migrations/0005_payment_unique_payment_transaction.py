@@ -0,0 +1,41 @@
+# Generated by Django 4.0.3 on 2026-10-19 10:12
+
+from django.db import migrations, models
+
+
+def merge_duplicate_payments(apps, schema_editor):
+    # Racing payment callbacks could record the same gateway transaction
+    # twice. Keep the oldest Payment and repoint orders to it.
+    Payment = apps.get_model('orders', 'Payment')
+    Order = apps.get_model('orders', 'Order')
+    OrderedFood = apps.get_model('orders', 'OrderedFood')
+
+    duplicates = (
+        Payment.objects.values('payment_method', 'transaction_id')
+        .annotate(count=models.Count('id'), keep_id=models.Min('id'))
+        .filter(count__gt=1)
+    )
+    for dup in duplicates:
+        extra_ids = list(
+            Payment.objects.filter(payment_method=dup['payment_method'], transaction_id=dup['transaction_id'])
+            .exclude(id=dup['keep_id'])
+            .values_list('id', flat=True)
+        )
+        Order.objects.filter(payment_id__in=extra_ids).update(payment_id=dup['keep_id'])
+        OrderedFood.objects.filter(payment_id__in=extra_ids).update(payment_id=dup['keep_id'])
+        Payment.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_alter_payment_payment_method'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_payments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(fields=('payment_method', 'transaction_id'), name='unique_payment_transaction'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.0.3 on 2026-10-19 12:20
+
+import ast
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+import simplejson as json
+
+
+def backfill_vendor_totals(apps, schema_editor):
+    # total_data was stored as json.dumps({vendor_id: {subtotal: repr(tax_dict)}})
+    Order = apps.get_model('orders', 'Order')
+    OrderVendorTotal = apps.get_model('orders', 'OrderVendorTotal')
+    Vendor = apps.get_model('vendor', 'Vendor')
+
+    vendor_ids = set(Vendor.objects.values_list('id', flat=True))
+    batch = []
+    orders = Order.objects.exclude(total_data=None).only('id', 'total_data')
+    for order in orders.iterator(chunk_size=500):
+        total_data = order.total_data
+        if isinstance(total_data, str):
+            try:
+                total_data = json.loads(total_data)
+            except ValueError:
+                continue
+        if not isinstance(total_data, dict):
+            continue
+
+        for vendor_id, data in total_data.items():
+            if int(vendor_id) not in vendor_ids:
+                continue
+            subtotal = 0
+            tax = 0
+            tax_dict = {}
+            for key, val in data.items():
+                subtotal += float(key)
+                if isinstance(val, str):
+                    val = ast.literal_eval(val)
+                for tax_type, rates in val.items():
+                    rates = {str(percentage): float(amount) for percentage, amount in rates.items()}
+                    tax_dict[tax_type] = rates
+                    tax += sum(rates.values())
+            batch.append(OrderVendorTotal(
+                order_id=order.id,
+                vendor_id=int(vendor_id),
+                subtotal=subtotal,
+                tax_data=tax_dict,
+                total_tax=tax,
+                grand_total=subtotal + tax,
+            ))
+
+        if len(batch) >= 500:
+            OrderVendorTotal.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    OrderVendorTotal.objects.bulk_create(batch, ignore_conflicts=True)
+
+    # created_at is auto_now_add; the backfilled rows take their order's
+    order_created_at = Order.objects.filter(pk=OuterRef('order_id')).values('created_at')[:1]
+    OrderVendorTotal.objects.update(created_at=Subquery(order_created_at))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendor', '0005_alter_openinghour_options_and_more'),
+        ('orders', '0005_payment_unique_payment_transaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderVendorTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subtotal', models.FloatField()),
+                ('tax_data', models.JSONField(blank=True, default=dict, help_text="Data format: {'tax_type':{'tax_percentage':'tax_amount'}}")),
+                ('total_tax', models.FloatField()),
+                ('grand_total', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendor_totals', to='orders.order')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_totals', to='vendor.vendor')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ordervendortotal',
+            constraint=models.UniqueConstraint(fields=('order', 'vendor'), name='unique_order_vendor_total'),
+        ),
+        migrations.RunPython(backfill_vendor_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.0.3 on 2026-10-19 13:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendor', '0005_alter_openinghour_options_and_more'),
+        ('orders', '0006_ordervendortotal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorDailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('revenue', models.FloatField(default=0)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='vendor.vendor')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VendorMonthlyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('revenue', models.FloatField(default=0)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_revenue', to='vendor.vendor')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='vendordailyrevenue',
+            constraint=models.UniqueConstraint(fields=('vendor', 'date'), name='unique_vendor_daily_revenue'),
+        ),
+        migrations.AddConstraint(
+            model_name='vendormonthlyrevenue',
+            constraint=models.UniqueConstraint(fields=('vendor', 'month'), name='unique_vendor_monthly_revenue'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.0.3 on 2026-10-19 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_vendordailyrevenue_vendormonthlyrevenue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'is_ordered', 'created_at', 'id'], name='orders_user_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['is_ordered', 'created_at', 'id'], name='orders_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_number'], name='orders_order_number_idx'),
+        ),
+    ]
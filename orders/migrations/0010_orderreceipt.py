@@ -0,0 +1,23 @@
+# Generated by Django 4.0.3 on 2026-10-19 14:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_order_gateway_session_id_stripeevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='receipt', to='orders.order')),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.0.3 on 2026-10-19 16:12
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+from orders.partitions import convert_to_partitioned, convert_to_plain
+
+
+def partition_orderedfood(apps, schema_editor):
+    convert_to_partitioned(schema_editor, 'orders_orderedfood')
+
+
+def unpartition_orderedfood(apps, schema_editor):
+    convert_to_plain(schema_editor, 'orders_orderedfood')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_orderreceipt'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['created_at'], name='orders_created_brin'),
+        ),
+        migrations.RunPython(partition_orderedfood, unpartition_orderedfood),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.3 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_partition_orderedfood'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ordervendortotal',
+            index=models.Index(fields=['vendor', 'created_at', 'id'], name='orders_vendor_history_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.0.3 on 2026-10-19 19:40
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def copy_order_created_at(apps, schema_editor):
+    # Migration 0006 backfilled the vendor totals with its own timestamp;
+    # the vendor history pages and filters on created_at
+    Order = apps.get_model('orders', 'Order')
+    OrderVendorTotal = apps.get_model('orders', 'OrderVendorTotal')
+    order_created_at = Order.objects.filter(pk=OuterRef('order_id')).values('created_at')[:1]
+    OrderVendorTotal.objects.update(created_at=Subquery(order_created_at))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_ordervendortotal_history_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_order_created_at, migrations.RunPython.noop),
+    ]
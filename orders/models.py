@@ -1,11 +1,10 @@
-import json
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
 from accounts.models import User
 from menu.models import FoodItem
 from vendor.models import Vendor
-
-
-request_object = ''
+from .request_object import get_current_request
+import simplejson as json
 
 class Payment(models.Model):
     PAYMENT_METHOD = (
@@ -19,6 +18,12 @@ class Payment(models.Model):
     status = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # A gateway transaction can only ever pay for one order.
+            models.UniqueConstraint(fields=['payment_method', 'transaction_id'], name='unique_payment_transaction'),
+        ]
+
     def __str__(self):
         return self.transaction_id
 
@@ -49,11 +54,23 @@ class Order(models.Model):
     total_data = models.JSONField(blank=True, null=True)
     total_tax = models.FloatField()
     payment_method = models.CharField(max_length=25)
+    gateway_session_id = models.CharField(max_length=255, blank=True, help_text='Checkout session id at the payment gateway')
     status = models.CharField(max_length=15, choices=STATUS, default='New')
     is_ordered = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the order history, see orders.history
+            models.Index(fields=['user', 'is_ordered', 'created_at', 'id'], name='orders_user_history_idx'),
+            models.Index(fields=['is_ordered', 'created_at', 'id'], name='orders_history_idx'),
+            models.Index(fields=['order_number'], name='orders_order_number_idx'),
+            # Orders are referenced by several foreign keys, so the table is not
+            # partitioned; a BRIN index serves the recent-window range scans
+            BrinIndex(fields=['created_at'], name='orders_created_brin'),
+        ]
+
     # Concatenate first name and last name
     @property
     def name(self):
@@ -62,41 +79,90 @@ class Order(models.Model):
     def order_placed_to(self):
         return ", ".join([str(i) for i in self.vendors.all()])
 
-    def get_total_by_vendor(self):
-        vendor = Vendor.objects.get(user=request_object.user)
-        subtotal = 0
-        tax = 0
-        tax_dict = {}
-        if self.total_data:
-            total_data = json.loads(self.total_data)
-            data = total_data.get(str(vendor.id))
-            
-            
-            for key, val in data.items():
-                subtotal += float(key)
-                val = val.replace("'", '"')
-                val = json.loads(val)
-                tax_dict.update(val)
-
-                # calculate tax
-                # {'CGST': {'9.00': '6.03'}, 'SGST': {'7.00': '4.69'}}
-                for i in val:
-                    for j in val[i]:
-                        tax += float(val[i][j])
-        grand_total = float(subtotal) + float(tax)
-        context = {
-            'subtotal': subtotal,
-            'tax_dict': tax_dict, 
-            'grand_total': grand_total,
+    def get_total_by_vendor(self, vendor=None):
+        # Without an explicit vendor, use the vendor logged in on the current request
+        if vendor is None:
+            vendor_totals = self.vendor_totals.filter(vendor__user=get_current_request().user)
+        else:
+            vendor_totals = self.vendor_totals.filter(vendor=vendor)
+        vendor_total = vendor_totals.first()
+        if vendor_total is None:
+            return OrderVendorTotal.empty_totals()
+        return vendor_total.get_totals()
+
+    def __str__(self):
+        return self.order_number
+
+
+class OrderVendorTotal(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='vendor_totals')
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='order_totals')
+    subtotal = models.FloatField()
+    tax_data = models.JSONField(blank=True, default=dict, help_text = "Data format: {'tax_type':{'tax_percentage':'tax_amount'}}")
+    total_tax = models.FloatField()
+    grand_total = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'vendor'], name='unique_order_vendor_total'),
+        ]
+        indexes = [
+            # Vendor order history, keyset paginated on (created_at, id)
+            models.Index(fields=['vendor', 'created_at', 'id'], name='orders_vendor_history_idx'),
+        ]
+
+    @staticmethod
+    def empty_totals():
+        return {
+            'subtotal': 0,
+            'tax_dict': {},
+            'grand_total': 0,
         }
 
-        return context
+    def get_totals(self):
+        return {
+            'subtotal': self.subtotal,
+            'tax_dict': self.tax_data,
+            'grand_total': self.grand_total,
+        }
 
     def __str__(self):
-        return self.order_number
+        return f'{self.order} - {self.vendor}'
+
+
+class VendorDailyRevenue(models.Model):
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='daily_revenue')
+    date = models.DateField()
+    revenue = models.FloatField(default=0)
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['vendor', 'date'], name='unique_vendor_daily_revenue'),
+        ]
+
+    def __str__(self):
+        return f'{self.vendor} - {self.date}'
+
+
+class VendorMonthlyRevenue(models.Model):
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='monthly_revenue')
+    month = models.DateField(help_text='First day of the month')
+    revenue = models.FloatField(default=0)
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['vendor', 'month'], name='unique_vendor_monthly_revenue'),
+        ]
+
+    def __str__(self):
+        return f'{self.vendor} - {self.month:%B %Y}'
 
 
 class OrderedFood(models.Model):
+    # Partitioned by month of created_at, see orders.partitions
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, blank=True, null=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -108,4 +174,93 @@ class OrderedFood(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return self.fooditem.food_title
\ No newline at end of file
+        return self.fooditem.food_title
+
+
+class StripeEvent(models.Model):
+    """Stripe webhook events already handled; Stripe delivers events at least once"""
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.event_id
+
+
+class OrderReceipt(models.Model):
+    """
+    Immutable snapshot of a finalized order: line items with their title,
+    price, quantity and vendor, the totals and taxes, and the same per
+    vendor. Written once by finalize_order; the order pages and emails
+    render from it instead of joining OrderedFood and the food items.
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='receipt')
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @staticmethod
+    def snapshot(order, lines=None):
+        """Receipt data of ``order``; ``lines`` are its OrderedFood rows with fooditem and vendor loaded"""
+        if lines is None:
+            lines = OrderedFood.objects.filter(order=order).select_related('fooditem__vendor').order_by('id')
+
+        items = []
+        for line in lines:
+            fooditem = line.fooditem
+            items.append({
+                'fooditem_id': fooditem.id,
+                'title': fooditem.food_title,
+                'image': fooditem.image.url if fooditem.image else '',
+                # Lines built in memory may hold Decimals, which JSONField cannot store
+                'price': float(line.price),
+                'quantity': line.quantity,
+                'amount': float(line.amount),
+                'vendor_id': fooditem.vendor_id,
+                'vendor_name': fooditem.vendor.vendor_name,
+                'vendor_slug': fooditem.vendor.vendor_slug,
+            })
+
+        tax_data = order.tax_data or {}
+        if isinstance(tax_data, str):
+            tax_data = json.loads(tax_data)
+
+        return {
+            'payment_method': order.payment_method,
+            'transaction_id': order.payment.transaction_id if order.payment_id else '',
+            'items': items,
+            'subtotal': round(sum(item['amount'] for item in items), 2),
+            'tax_data': tax_data,
+            'total_tax': order.total_tax,
+            'grand_total': order.total,
+            'vendors': [
+                {
+                    'vendor_id': vendor_total.vendor_id,
+                    'subtotal': vendor_total.subtotal,
+                    'tax_data': vendor_total.tax_data,
+                    'grand_total': vendor_total.grand_total,
+                }
+                for vendor_total in OrderVendorTotal.objects.filter(order=order)
+            ],
+        }
+
+    @classmethod
+    def for_order(cls, order):
+        """The receipt of a finalized order; orders finalized before receipts existed get one on first access"""
+        try:
+            return order.receipt
+        except cls.DoesNotExist:
+            receipt, _ = cls.objects.get_or_create(order=order, defaults={'data': cls.snapshot(order)})
+            return receipt
+
+    def for_vendor(self, vendor_id):
+        """The part of the receipt that concerns one vendor"""
+        totals = next((v for v in self.data['vendors'] if v['vendor_id'] == vendor_id), None) or {}
+        return {
+            'items': [item for item in self.data['items'] if item['vendor_id'] == vendor_id],
+            'subtotal': totals.get('subtotal', 0),
+            'tax_data': totals.get('tax_data', {}),
+            'grand_total': totals.get('grand_total', 0),
+        }
+
+    def __str__(self):
+        return f'Receipt {self.order}'
@@ -0,0 +1,194 @@
+"""
+Monthly range partitioning of the append-only, time-ordered tables.
+
+OrderedFood and UserActivity are PostgreSQL partitioned tables, split by
+month of ``created_at``, so queries on a recent window (trending items,
+recent activity) only read the last one or two partitions, and old months
+can be detached and archived without a long DELETE. Their primary key is
+(id, created_at), as PostgreSQL requires; Django still treats ``id`` as
+the primary key, which stays unique through the shared sequence.
+
+A DEFAULT partition catches rows outside the existing months.
+create_partition() moves such rows into the new month, so partitions can
+also be created late. ``manage.py manage_partitions`` creates the coming
+months and detaches/archives the old ones.
+"""
+
+import gzip
+import os
+import re
+from datetime import date
+
+from django.db import connection, transaction
+
+
+PARTITIONED_TABLES = {
+    'orders_orderedfood': 'created_at',
+    'recommendations_useractivity': 'created_at',
+}
+
+PARTITION_NAME_RE = re.compile(r'_p(\d{4})_(\d{2})$')
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y_%m}'
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def existing_partitions(cursor, table):
+    """{month: partition name} of the monthly partitions of ``table``"""
+    cursor.execute(
+        """
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.oid = to_regclass(%s)
+        """,
+        [table],
+    )
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        match = PARTITION_NAME_RE.search(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def create_partition(cursor, table, month):
+    """Create the partition of ``month``, moving its rows out of the DEFAULT partition"""
+    column = PARTITIONED_TABLES.get(table, 'created_at')
+    name = partition_name(table, month)
+    start, end = f'{month:%Y-%m-%d} 00:00:00+00', f'{add_months(month, 1):%Y-%m-%d} 00:00:00+00'
+    cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM "{table}_default" WHERE "{column}" >= %s AND "{column}" < %s RETURNING *
+        )
+        INSERT INTO "{name}" SELECT * FROM moved
+        """,
+        [start, end],
+    )
+    cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', [start, end])
+    return name
+
+
+def ensure_partitions(months_ahead=3, today=None):
+    """Create the missing partitions from the current month to ``months_ahead`` months ahead"""
+    current = (today or date.today()).replace(day=1)
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(cursor, table):
+                continue
+            existing = existing_partitions(cursor, table)
+            for offset in range(months_ahead + 1):
+                month = add_months(current, offset)
+                if month not in existing:
+                    created.append(create_partition(cursor, table, month))
+    return created
+
+
+def detach_partitions(before, archive_dir=None, drop=False):
+    """
+    Detach the partitions of the months before ``before``. With
+    ``archive_dir`` each one is first written there as a gzipped CSV file;
+    with ``drop`` the detached table is dropped, otherwise it is kept as a
+    standalone table.
+    """
+    detached = []
+    for table in PARTITIONED_TABLES:
+        with transaction.atomic(), connection.cursor() as cursor:
+            if not is_partitioned(cursor, table):
+                continue
+            for month, name in sorted(existing_partitions(cursor, table).items()):
+                if month >= before:
+                    continue
+                cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                if archive_dir:
+                    with gzip.open(os.path.join(archive_dir, f'{name}.csv.gz'), 'wt', encoding='utf-8') as archive:
+                        cursor.copy_expert(f'COPY "{name}" TO STDOUT WITH CSV HEADER', archive)
+                if drop:
+                    cursor.execute(f'DROP TABLE "{name}"')
+                detached.append(name)
+    return detached
+
+
+def convert_to_partitioned(schema_editor, table, months_ahead=3):
+    """
+    Migration helper: rebuild ``table`` as a partitioned table with the same
+    columns, indexes and foreign keys, and copy the rows over.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    column = PARTITIONED_TABLES[table]
+    with schema_editor.connection.cursor() as cursor:
+        if is_partitioned(cursor, table):
+            return
+        cursor.execute("SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s", [table, f'{table}_pkey'])
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'", [table])
+        foreign_keys = cursor.fetchall()
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f'SELECT min("{column}") FROM "{table}"')
+        oldest = cursor.fetchone()[0]
+
+        old = f'{table}_unpartitioned'
+        cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+        cursor.execute(f'ALTER TABLE "{old}" RENAME CONSTRAINT "{table}_pkey" TO "{old}_pkey"')
+        cursor.execute(f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE ("{column}")')
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY ("id", "{column}")')
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{table}"."id"')
+        cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+        current = date.today().replace(day=1)
+        month = oldest.date().replace(day=1) if oldest else current
+        while month <= add_months(current, months_ahead):
+            create_partition(cursor, table, month)
+            month = add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{old}"')
+        cursor.execute(f'DROP TABLE "{old}"')
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+
+
+def convert_to_plain(schema_editor, table):
+    """Migration helper: the reverse of convert_to_partitioned()"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not is_partitioned(cursor, table):
+            return
+        cursor.execute("SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s", [table, f'{table}_pkey'])
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'", [table])
+        foreign_keys = cursor.fetchall()
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+
+        old = f'{table}_partitioned'
+        cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+        cursor.execute(f'ALTER TABLE "{old}" RENAME CONSTRAINT "{table}_pkey" TO "{old}_pkey"')
+        cursor.execute(f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY ("id")')
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{table}"."id"')
+        cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{old}"')
+        cursor.execute(f'DROP TABLE "{old}"')
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
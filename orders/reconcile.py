@@ -0,0 +1,84 @@
+"""
+Gateway lookups for orders whose payment callback never arrived, used by
+``manage.py reconcile_payments``.
+
+The lookups only talk to the gateways (no database access), so they can
+run in a thread pool; RateLimiter keeps the pool under the gateway's rate
+limits.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+import stripe
+
+from .gateways import GatewayError, sslcommerz
+from .services import amount_matches
+
+
+PAID = 'paid'
+FAILED = 'failed'  # The gateway says the payment will not happen
+PENDING = 'pending'  # Still payable, or the gateway does not know the order
+ERROR = 'error'  # The lookup itself failed; try again next run
+
+PaymentStatus = namedtuple('PaymentStatus', ['state', 'transaction_id'])
+
+
+class RateLimiter:
+    """Thread-safe limiter allowing ``rate`` calls per second"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_call = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def lookup_stripe(order):
+    if not order.gateway_session_id:
+        return PaymentStatus(PENDING, None)
+    try:
+        session = stripe.checkout.Session.retrieve(order.gateway_session_id)
+    except stripe.error.InvalidRequestError:
+        # Unknown session: nothing was paid through it
+        return PaymentStatus(PENDING, None)
+    if session.payment_status == 'paid':
+        return PaymentStatus(PAID, session.payment_intent)
+    if session.status == 'expired':
+        return PaymentStatus(FAILED, None)
+    return PaymentStatus(PENDING, None)
+
+
+def lookup_sslcommerz(order):
+    result = sslcommerz.query_transaction(order.order_number)
+    transactions = result.get('element') or []
+    for transaction in transactions:
+        if transaction.get('status') in ('VALID', 'VALIDATED') and amount_matches(order, transaction.get('amount')):
+            return PaymentStatus(PAID, transaction['val_id'])
+    if transactions and all(t.get('status') in ('FAILED', 'CANCELLED', 'EXPIRED') for t in transactions):
+        return PaymentStatus(FAILED, None)
+    return PaymentStatus(PENDING, None)
+
+
+LOOKUPS = {
+    'Stripe': lookup_stripe,
+    'SSLCommerz': lookup_sslcommerz,
+}
+
+
+def lookup_payment(order, rate_limiter=None):
+    """Ask the order's gateway about its payment; never raises"""
+    if rate_limiter:
+        rate_limiter.wait()
+    try:
+        return LOOKUPS[order.payment_method](order)
+    except (GatewayError, stripe.error.StripeError):
+        return PaymentStatus(ERROR, None)
@@ -1,18 +1,40 @@
-from . import models
+import asyncio
+from contextvars import ContextVar
 
-def RequestObjectMiddleware(get_response):
-    # One-time configuration and initialization.
+from django.utils.decorators import sync_and_async_middleware
+
+
+# Request-local storage. Each thread / asyncio task sees its own request,
+# so this is safe under threaded and ASGI workers.
+current_request = ContextVar('current_request', default=None)
 
-    def middleware(request):
-        # Code to be executed for each request before
-        # the view (and later middleware) are called.
-        models.request_object = request
 
-        response = get_response(request)
+def get_current_request():
+    return current_request.get()
+
+
+@sync_and_async_middleware
+def RequestObjectMiddleware(get_response):
+    # One-time configuration and initialization.
 
-        # Code to be executed for each request/response after
-        # the view is called.
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = current_request.set(request)
+            try:
+                return await get_response(request)
+            finally:
+                current_request.reset(token)
 
-        return response
+    else:
+        def middleware(request):
+            # Code to be executed for each request before
+            # the view (and later middleware) are called.
+            token = current_request.set(request)
+            try:
+                return get_response(request)
+            finally:
+                # Code to be executed for each request/response after
+                # the view is called.
+                current_request.reset(token)
 
-    return middleware
\ No newline at end of file
+    return middleware
@@ -0,0 +1,253 @@
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.utils import send_notification
+from marketplace.models import Cart
+from marketplace.session_cart import CartBusy, SessionCart
+from menu.models import FoodItem
+from vendor.models import Vendor
+from .events import publish_order
+from .models import Order, OrderedFood, OrderReceipt, OrderVendorTotal, Payment, StripeEvent, VendorDailyRevenue, VendorMonthlyRevenue
+
+
+logger = logging.getLogger(__name__)
+
+
+class FinalizeError(Exception):
+    """A paid order that cannot be finalized automatically"""
+
+
+class PaymentConflict(FinalizeError):
+    """The gateway transaction has already paid for another order"""
+
+
+class MissingOrderLines(FinalizeError):
+    """The order was placed before its lines were saved; finalize it by hand"""
+
+
+def to_minor_units(amount):
+    """``amount`` in the smallest currency unit (paisa), as the gateways count it"""
+    return round(float(amount) * 100)
+
+
+def amount_matches(order, amount):
+    """Whether ``amount``, reported paid by a gateway, is the order's total"""
+    try:
+        return to_minor_units(amount) == to_minor_units(order.total)
+    except (TypeError, ValueError):
+        return False
+
+
+def checkout_lines(cart_items):
+    """The lines of an order placed from ``cart_items``, saved in its total_data"""
+    return [
+        {'fooditem_id': item.fooditem_id, 'quantity': item.quantity, 'price': float(item.fooditem.price)}
+        for item in cart_items
+    ]
+
+
+def order_lines(order):
+    """
+    The lines saved when the order was placed. Older orders hold no lines:
+    their total_data is None or the per-vendor totals, often as a JSON
+    string (see migration 0006). The food items paid for cannot be told
+    from those, and the current cart may differ, so they raise
+    MissingOrderLines.
+    """
+    total_data = order.total_data
+    if not isinstance(total_data, dict) or not isinstance(total_data.get('items'), list):
+        raise MissingOrderLines(f'Order {order.order_number} was placed without saved lines')
+    return total_data['items']
+
+
+def finalize_order(order_number, transaction_id, payment_method, status='Completed', user=None, domain=None):
+    """
+    Mark an order as paid and move the lines saved when it was placed into
+    OrderedFood. The customer's cart may have changed since; only the
+    ordered quantities are taken out of it.
+
+    Everything happens in one transaction with the order row locked, so the
+    payment callbacks that can arrive together for the same order (e.g. the
+    SSLCommerz success redirect and its IPN) are serialised. The transaction
+    id is the idempotency key: a repeated callback finds the order already
+    finalized and writes nothing.
+
+    The confirmation emails are queued in the outbox as part of the same
+    transaction; ``domain`` is used for the links inside them.
+
+    Returns ``(order, created)``. ``created`` is False for duplicate calls.
+    Raises ``Order.DoesNotExist`` for an unknown order number,
+    PaymentConflict when the transaction id already paid another order and
+    MissingOrderLines for an order placed without saved lines; nothing is
+    written then.
+    """
+    with transaction.atomic():
+        orders = Order.objects.select_for_update()
+        if user is not None:
+            orders = orders.filter(user=user)
+        order = orders.get(order_number=order_number)
+        if order.is_ordered:
+            return order, False
+        lines = order_lines(order)
+
+        payment, created = Payment.objects.get_or_create(
+            payment_method=payment_method,
+            transaction_id=transaction_id,
+            defaults={
+                'user': order.user,
+                'amount': order.total,
+                'status': status,
+            },
+        )
+        if not created:
+            # Lock the payment, so two orders cannot both claim it
+            payment = Payment.objects.select_for_update().get(pk=payment.pk)
+            if Order.objects.filter(payment=payment).exclude(pk=order.pk).exists():
+                raise PaymentConflict(f'{payment_method} transaction {transaction_id} already paid for another order')
+
+        order.payment = payment
+        order.is_ordered = True
+        order.save(update_fields=['payment', 'is_ordered', 'updated_at'])
+
+        # Move the order's lines to the ordered food model
+        fooditems = FoodItem.objects.select_related('vendor').in_bulk([line['fooditem_id'] for line in lines])
+        ordered_food = OrderedFood.objects.bulk_create([
+            OrderedFood(
+                order=order,
+                payment=payment,
+                user=order.user,
+                fooditem=fooditems[line['fooditem_id']],
+                quantity=line['quantity'],
+                price=line['price'],
+                amount=round(line['price'] * line['quantity'], 2),
+            )
+            for line in lines
+            if line['fooditem_id'] in fooditems
+        ])
+
+        # Take the ordered quantities out of the cart
+        quantities = {line['fooditem_id']: line['quantity'] for line in lines}
+        remove_from_cart(order.user, quantities)
+        transaction.on_commit(lambda: take_from_cached_cart(order.user, quantities))
+
+        receipt = OrderReceipt.objects.create(order=order, data=OrderReceipt.snapshot(order, ordered_food))
+
+        record_vendor_revenue(order)
+        publish_order(order)
+        send_order_emails(order, receipt, domain)
+
+    return order, True
+
+
+def remove_from_cart(user, quantities):
+    """Take ``quantities`` ({fooditem_id: quantity}) out of the user's Cart rows"""
+    for cart in Cart.objects.select_for_update().filter(user=user, fooditem_id__in=quantities):
+        if cart.quantity > quantities[cart.fooditem_id]:
+            cart.quantity -= quantities[cart.fooditem_id]
+            cart.save(update_fields=['quantity', 'updated_at'])
+        else:
+            cart.delete()
+
+
+def take_from_cached_cart(user, quantities):
+    try:
+        SessionCart.for_user(user).take(quantities)
+    except CartBusy:
+        # Reload it from the Cart rows, which no longer hold the ordered quantities
+        logger.warning('Cart of user %s is busy, discarding its cached copy', user.id)
+        SessionCart.discard(user.id)
+
+
+def handle_stripe_event(event, domain=None):
+    """
+    Apply a verified Stripe webhook event. Paid checkout sessions finalize
+    their order, when the session is the one created for the order and its
+    amount is the order's total. Each event id is handled once: a
+    redelivered event only finds its StripeEvent row. Returns False for
+    duplicates.
+    """
+    with transaction.atomic():
+        _, created = StripeEvent.objects.get_or_create(event_id=event['id'], defaults={'type': event['type']})
+        if not created:
+            return False
+
+        session = event['data']['object']
+        if event['type'] in ('checkout.session.completed', 'checkout.session.async_payment_succeeded') \
+                and session.get('payment_status') == 'paid':
+            order_number = (session.get('metadata') or {}).get('order_number')
+            order = Order.objects.filter(order_number=order_number).first()
+            if order is None:
+                logger.warning('Stripe event %s refers to unknown order %s', event['id'], order_number)
+            elif not order.gateway_session_id or session.get('id') != order.gateway_session_id:
+                logger.warning('Stripe event %s: session %s is not the session of order %s', event['id'], session.get('id'), order_number)
+            elif session.get('amount_total') != to_minor_units(order.total):
+                logger.warning('Stripe event %s: amount %s does not match order %s', event['id'], session.get('amount_total'), order_number)
+            else:
+                try:
+                    finalize_order(order_number, session['payment_intent'], 'Stripe', domain=domain)
+                except FinalizeError as e:
+                    logger.error('Stripe event %s: %s', event['id'], e)
+    return True
+
+
+def record_vendor_revenue(order):
+    """Add a finalized order to the daily and monthly revenue rollups of its vendors"""
+    day = timezone.localdate(order.created_at)
+    month = day.replace(day=1)
+    for vendor_total in OrderVendorTotal.objects.filter(order=order):
+        _add_revenue(VendorDailyRevenue, vendor_total.vendor_id, {'date': day}, vendor_total.grand_total)
+        _add_revenue(VendorMonthlyRevenue, vendor_total.vendor_id, {'month': month}, vendor_total.grand_total)
+
+
+def _add_revenue(model, vendor_id, period, revenue, order_count=1):
+    rollup = model.objects.filter(vendor_id=vendor_id, **period)
+    changes = {
+        'revenue': F('revenue') + revenue,
+        'order_count': F('order_count') + order_count,
+    }
+    if rollup.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(vendor_id=vendor_id, revenue=revenue, order_count=order_count, **period)
+    except IntegrityError:
+        # Another order for the vendor created the row first
+        rollup.update(**changes)
+
+
+def send_order_emails(order, receipt, domain):
+    """Queue the order confirmation emails to the customer and vendors"""
+    # SEND ORDER CONFIRMATION EMAIL TO THE CUSTOMER
+    mail_subject = 'Thank you for ordering with us.'
+    mail_template = 'orders/order_confirmation_email.html'
+    context = {
+        'user': order.user,
+        'order': order,
+        'to_email': order.email,
+        'ordered_food': receipt.data['items'],
+        'domain': domain,
+        'customer_subtotal': receipt.data['subtotal'],
+        'tax_data': receipt.data['tax_data'],
+    }
+    send_notification(mail_subject, mail_template, context)
+
+    # SEND ORDER RECEIVED EMAIL TO THE VENDOR
+    mail_subject = 'You have received a new order.'
+    mail_template = 'orders/new_order_received.html'
+    vendor_ids = {item['vendor_id'] for item in receipt.data['items']}
+    vendor_emails = Vendor.objects.filter(id__in=vendor_ids).values_list('id', 'user__email')
+    for vendor_id, email in vendor_emails:
+        vendor_receipt = receipt.for_vendor(vendor_id)
+        context = {
+            'order': order,
+            'to_email': email,
+            'ordered_food_to_vendor': vendor_receipt['items'],
+            'domain': domain,
+            'vendor_subtotal': vendor_receipt['subtotal'],
+            'tax_data': vendor_receipt['tax_data'],
+            'vendor_grand_total': vendor_receipt['grand_total'],
+        }
+        send_notification(mail_subject, mail_template, context)
@@ -1,3 +1,244 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import User, UserProfile
+from marketplace.models import Cart
+from menu.models import Category, FoodItem
+from vendor.models import Vendor
+from .models import Order, OrderedFood, OrderReceipt, OrderVendorTotal, Payment
+from .reconcile import ERROR, FAILED, PAID, PENDING, PaymentStatus
+from .services import MissingOrderLines, checkout_lines, finalize_order
+
+
+class OrderTestMixin:
+    """A vendor with two food items and a customer who placed an order of one of them"""
+
+    def setUp(self):
+        vendor_user = User.objects.create_user('Vendor', 'Owner', 'vendor', 'vendor@example.com', 'secret')
+        self.vendor = Vendor.objects.create(
+            user=vendor_user,
+            user_profile=UserProfile.objects.get(user=vendor_user),
+            vendor_name='Test Kitchen',
+            vendor_slug='test-kitchen',
+            vendor_license='vendor/license/test.jpg',
+            is_approved=True,
+        )
+        category = Category.objects.create(vendor=self.vendor, category_name='Mains', slug='test-kitchen-mains')
+        self.burger = FoodItem.objects.create(
+            vendor=self.vendor, category=category, food_title='Burger', slug='burger', price='250.50', image='foodimages/burger.jpg',
+        )
+        self.fries = FoodItem.objects.create(
+            vendor=self.vendor, category=category, food_title='Fries', slug='fries', price='90.00', image='foodimages/fries.jpg',
+        )
+        self.customer = User.objects.create_user('Test', 'Customer', 'customer', 'customer@example.com', 'secret')
+
+    def place_order(self, payment_method='SSLCommerz', order_number='2026101900001', quantity=2):
+        """An unpaid order of ``quantity`` burgers, placed the way orders.views.place_order does"""
+        cart, _ = Cart.objects.update_or_create(user=self.customer, fooditem=self.burger, defaults={'quantity': quantity})
+        subtotal = float(self.burger.price) * quantity
+        order = Order.objects.create(
+            user=self.customer,
+            order_number=order_number,
+            first_name='Test',
+            last_name='Customer',
+            email='customer@example.com',
+            address='1 Test Road',
+            city='Dhaka',
+            pin_code='1000',
+            total=subtotal,
+            tax_data={},
+            total_tax=0,
+            total_data={'items': checkout_lines(Cart.objects.filter(pk=cart.pk).select_related('fooditem'))},
+            payment_method=payment_method,
+            gateway_session_id='cs_test_session' if payment_method == 'Stripe' else '',
+        )
+        order.vendors.add(self.vendor)
+        OrderVendorTotal.objects.create(order=order, vendor=self.vendor, subtotal=subtotal, tax_data={}, total_tax=0, grand_total=subtotal)
+        return order
+
+    def place_legacy_order(self, order_number='2026101900009'):
+        """An unpaid order placed before the lines were saved: total_data is a JSON string of the vendor totals"""
+        order = self.place_order(order_number=order_number)
+        legacy_total_data = '{"%s": {"501.0": "{}"}}' % self.vendor.id
+        Order.objects.filter(pk=order.pk).update(total_data=legacy_total_data)
+        order.refresh_from_db()
+        return order
+
+    def age(self, order, **delta):
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(**delta))
+
+
+@mock.patch('dishonline_main.management.commands.reconcile_payments.lookup_payment')
+class ReconcilePaymentsTests(OrderTestMixin, TestCase):
+
+    def reconcile(self, *args):
+        stdout = StringIO()
+        call_command('reconcile_payments', '--rate', '0', *args, stdout=stdout, stderr=StringIO())
+        return stdout.getvalue()
+
+    def test_paid_order_is_finalized_from_the_saved_lines(self, lookup_payment):
+        order = self.place_order()
+        self.age(order, hours=1)
+        # The customer changed the cart after checkout
+        Cart.objects.filter(user=self.customer, fooditem=self.burger).update(quantity=3)
+        Cart.objects.create(user=self.customer, fooditem=self.fries, quantity=1)
+        lookup_payment.return_value = PaymentStatus(PAID, 'val_paid')
+
+        output = self.reconcile()
+
+        order.refresh_from_db()
+        self.assertTrue(order.is_ordered)
+        self.assertEqual(order.payment.transaction_id, 'val_paid')
+        self.assertEqual(
+            list(OrderedFood.objects.filter(order=order).values_list('fooditem_id', 'quantity', 'price', 'amount')),
+            [(self.burger.id, 2, 250.5, 501.0)],
+        )
+        # Only the ordered quantity left the cart
+        self.assertEqual(
+            dict(Cart.objects.filter(user=self.customer).values_list('fooditem_id', 'quantity')),
+            {self.burger.id: 1, self.fries.id: 1},
+        )
+        self.assertIn('1 finalized', output)
+
+    def test_failed_payment_is_cancelled(self, lookup_payment):
+        order = self.place_order()
+        self.age(order, hours=1)
+        lookup_payment.return_value = PaymentStatus(FAILED, None)
+
+        self.reconcile()
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'Cancelled')
+        self.assertFalse(order.is_ordered)
+
+    def test_pending_order_is_cancelled_after_cancel_after(self, lookup_payment):
+        recent = self.place_order(order_number='2026101900001')
+        self.age(recent, hours=1)
+        old = self.place_order(order_number='2026101900002')
+        self.age(old, hours=30)
+        lookup_payment.return_value = PaymentStatus(PENDING, None)
+
+        output = self.reconcile('--cancel-after', '24')
+
+        recent.refresh_from_db()
+        old.refresh_from_db()
+        self.assertEqual(recent.status, 'New')
+        self.assertEqual(old.status, 'Cancelled')
+        self.assertIn('1 cancelled, 1 pending', output)
+
+    def test_recent_orders_and_lookup_errors_are_left_alone(self, lookup_payment):
+        recent = self.place_order(order_number='2026101900001')
+        failing = self.place_order(order_number='2026101900002')
+        self.age(failing, days=2)
+        lookup_payment.return_value = PaymentStatus(ERROR, None)
+
+        output = self.reconcile('--older-than', '30')
+
+        self.assertEqual(lookup_payment.call_count, 1)
+        for order in (recent, failing):
+            order.refresh_from_db()
+            self.assertEqual(order.status, 'New')
+            self.assertFalse(order.is_ordered)
+        self.assertIn('1 errors', output)
+
+    def test_transaction_of_another_order_is_refused(self, lookup_payment):
+        paid = self.place_order(order_number='2026101900001')
+        paid.payment = Payment.objects.create(
+            user=self.customer, transaction_id='val_reused', payment_method='SSLCommerz', amount='501.0', status='Completed',
+        )
+        paid.is_ordered = True
+        paid.save()
+        order = self.place_order(order_number='2026101900002')
+        self.age(order, hours=1)
+        lookup_payment.return_value = PaymentStatus(PAID, 'val_reused')
+
+        output = self.reconcile()
+
+        order.refresh_from_db()
+        self.assertFalse(order.is_ordered)
+        self.assertIsNone(order.payment)
+        self.assertIn('0 finalized', output)
+
+    def test_legacy_order_is_refused_and_the_run_goes_on(self, lookup_payment):
+        legacy = self.place_legacy_order(order_number='2026101900001')
+        order = self.place_order(order_number='2026101900002')
+        for pending in (legacy, order):
+            self.age(pending, hours=1)
+        lookup_payment.side_effect = lambda order, rate_limiter=None: PaymentStatus(PAID, f'val_{order.order_number}')
+
+        output = self.reconcile()
+
+        legacy.refresh_from_db()
+        order.refresh_from_db()
+        self.assertFalse(legacy.is_ordered)
+        self.assertIsNone(legacy.payment)
+        self.assertFalse(OrderedFood.objects.filter(order=legacy).exists())
+        self.assertTrue(order.is_ordered)
+        self.assertIn('1 finalized', output)
+        self.assertIn('1 errors', output)
+
+    def test_dry_run_changes_nothing(self, lookup_payment):
+        paid = self.place_order(order_number='2026101900001')
+        failed = self.place_order(order_number='2026101900002')
+        for order in (paid, failed):
+            self.age(order, hours=1)
+        lookup_payment.side_effect = lambda order, rate_limiter=None: PaymentStatus(
+            PAID if order.pk == paid.pk else FAILED, 'val_paid' if order.pk == paid.pk else None,
+        )
+
+        output = self.reconcile('--dry-run')
+
+        for order in (paid, failed):
+            order.refresh_from_db()
+            self.assertFalse(order.is_ordered)
+            self.assertEqual(order.status, 'New')
+        self.assertIn('Dry run: 2 checked, 1 finalized, 1 cancelled', output)
+
+
+class FinalizeOrderTests(OrderTestMixin, TestCase):
+
+    def test_finalize_order_writes_the_receipt(self):
+        order = self.place_order(quantity=3)
+        # The customer added an item after checkout
+        Cart.objects.create(user=self.customer, fooditem=self.fries, quantity=1)
+
+        order, created = finalize_order(order.order_number, 'val_1', 'SSLCommerz')
+
+        self.assertTrue(created)
+        receipt = OrderReceipt.objects.get(order=order)
+        self.assertEqual(receipt.data['transaction_id'], 'val_1')
+        self.assertEqual(receipt.data['subtotal'], 751.5)
+        self.assertEqual(len(receipt.data['items']), 1)
+        item = receipt.data['items'][0]
+        self.assertEqual((item['fooditem_id'], item['price'], item['quantity'], item['amount']), (self.burger.id, 250.5, 3, 751.5))
+        self.assertEqual(receipt.for_vendor(self.vendor.id)['grand_total'], 751.5)
+        self.assertEqual(list(Cart.objects.filter(user=self.customer).values_list('fooditem_id', flat=True)), [self.fries.id])
+
+    def test_repeated_callback_writes_nothing(self):
+        order = self.place_order()
+        finalize_order(order.order_number, 'val_1', 'SSLCommerz')
+
+        order, created = finalize_order(order.order_number, 'val_1', 'SSLCommerz')
+
+        self.assertFalse(created)
+        self.assertEqual(Payment.objects.filter(transaction_id='val_1').count(), 1)
+        self.assertEqual(OrderedFood.objects.filter(order=order).count(), 1)
+        self.assertEqual(OrderReceipt.objects.filter(order=order).count(), 1)
+
+    def test_legacy_order_is_not_billed_from_the_cart(self):
+        order = self.place_legacy_order()
+        self.assertIsInstance(order.total_data, str)
+
+        with self.assertRaises(MissingOrderLines):
+            finalize_order(order.order_number, 'val_legacy', 'SSLCommerz')
 
-# Create your tests here.
+        order.refresh_from_db()
+        self.assertFalse(order.is_ordered)
+        self.assertFalse(Payment.objects.filter(transaction_id='val_legacy').exists())
+        self.assertFalse(OrderedFood.objects.filter(order=order).exists())
+        self.assertTrue(Cart.objects.filter(user=self.customer, fooditem=self.burger).exists())
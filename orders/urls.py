@@ -3,12 +3,13 @@ from . import views
 
 urlpatterns = [
     path('place_order/', views.place_order, name='place_order'),
-    path('payments/', views.payments, name='payments'),
     path('order_complete/', views.order_complete, name='order_complete'),
 
     # Stripe
     path('stripe_success/', views.stripe_success, name='stripe_success'),
     path('stripe_cancel/', views.stripe_cancel, name='stripe_cancel'),
+    path('stripe_webhook/', views.stripe_webhook, name='stripe_webhook'),
+    path('order_status/', views.order_status, name='order_status'),
 
     # SSLCommerz
     path('sslcommerz_success/', views.sslcommerz_success, name='sslcommerz_success'),
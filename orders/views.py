@@ -1,66 +1,70 @@
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, redirect
 from django.views.decorators.csrf import csrf_exempt
-from marketplace.models import Cart, Tax
-from marketplace.context_processors import get_cart_amounts
-from menu.models import FoodItem
+from django.views.decorators.http import require_POST
+from marketplace.models import Cart
+from marketplace.cart import cart_amounts
+from marketplace.taxes import calculate_taxes
+from marketplace.session_cart import CART_BUSY_MESSAGE, CartBusy, SessionCart
 from .forms import OrderForm
-from .models import Order, OrderedFood, Payment
+from .models import Order, OrderReceipt, OrderVendorTotal
 import simplejson as json
-from .utils import generate_order_number, order_total_by_vendor
-from accounts.utils import send_notification
+from .utils import generate_order_number
+from .services import FinalizeError, amount_matches, checkout_lines, finalize_order, handle_stripe_event, to_minor_units
+from .gateways import GatewayError, sslcommerz
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.sites.shortcuts import get_current_site
 from django.conf import settings
+from asgiref.sync import sync_to_async
+import logging
 import stripe
-import requests
 
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+logger = logging.getLogger(__name__)
 
 
 @login_required(login_url='login')
 def place_order(request):
-    cart_items = Cart.objects.filter(user=request.user).order_by('created_at')
+    # Write the cached cart through, so the order is built from the Cart rows
+    try:
+        SessionCart.for_request(request).flush()
+    except CartBusy:
+        messages.error(request, CART_BUSY_MESSAGE)
+        return redirect('checkout')
+    cart_items = Cart.objects.filter(user=request.user).select_related('fooditem').order_by('created_at')
     cart_count = cart_items.count()
     if cart_count <= 0:
         return redirect('marketplace')
 
-    vendors_ids = []
-    for i in cart_items:
-        if i.fooditem.vendor.id not in vendors_ids:
-            vendors_ids.append(i.fooditem.vendor.id)
-
-    # {"vendor_id":{"subtotal":{"tax_type": {"tax_percentage": "tax_amount"}}}}
-    get_tax = Tax.objects.filter(is_active=True)
-    subtotal = 0
-    total_data = {}
-    k = {}
+    # {vendor_id: subtotal}
+    vendor_subtotals = {}
     for i in cart_items:
-        fooditem = FoodItem.objects.get(pk=i.fooditem.id, vendor_id__in=vendors_ids)
-        v_id = fooditem.vendor.id
-        if v_id in k:
-            subtotal = k[v_id]
-            subtotal += (fooditem.price * i.quantity)
-            k[v_id] = subtotal
-        else:
-            subtotal = (fooditem.price * i.quantity)
-            k[v_id] = subtotal
-
-        # Calculate the tax_data
-        tax_dict = {}
-        for i in get_tax:
-            tax_type = i.tax_type
-            tax_percentage = i.tax_percentage
-            tax_amount = round((tax_percentage * subtotal)/100, 2)
-            tax_dict.update({tax_type: {str(tax_percentage) : str(tax_amount)}})
-        # Construct total data
-        total_data.update({fooditem.vendor.id: {str(subtotal): str(tax_dict)}})
-
-    subtotal = get_cart_amounts(request)['subtotal']
-    total_tax = get_cart_amounts(request)['tax']
-    grand_total = get_cart_amounts(request)['grand_total']
-    tax_data = get_cart_amounts(request)['tax_dict']
+        v_id = i.fooditem.vendor_id
+        vendor_subtotals[v_id] = vendor_subtotals.get(v_id, 0) + (i.fooditem.price * i.quantity)
+    vendors_ids = list(vendor_subtotals)
+
+    # Calculate the tax_data of every vendor: {"tax_type": {"tax_percentage": tax_amount}}
+    vendor_totals = []
+    for v_id, vendor_subtotal in vendor_subtotals.items():
+        tax_dict = {
+            tax_type: {percentage: float(amount) for percentage, amount in taxes.items()}
+            for tax_type, taxes in calculate_taxes(vendor_subtotal).items()
+        }
+        vendor_tax = sum(x for key in tax_dict.values() for x in key.values())
+        vendor_totals.append(OrderVendorTotal(
+            vendor_id=v_id,
+            subtotal=vendor_subtotal,
+            tax_data=tax_dict,
+            total_tax=vendor_tax,
+            grand_total=float(vendor_subtotal) + vendor_tax,
+        ))
+
+    amounts = cart_amounts(sum(vendor_subtotals.values()))
+    subtotal = amounts['subtotal']
+    total_tax = amounts['tax']
+    grand_total = amounts['grand_total']
+    tax_data = amounts['tax_dict']
 
     if request.method == 'POST':
         form = OrderForm(request.POST)
@@ -78,13 +82,16 @@ def place_order(request):
             order.user = request.user
             order.total = grand_total
             order.tax_data = json.dumps(tax_data)
-            order.total_data = json.dumps(total_data)
             order.total_tax = total_tax
+            order.total_data = {'items': checkout_lines(cart_items)}
             order.payment_method = request.POST['payment_method']
             order.save()  # order id/ pk is generated
             order.order_number = generate_order_number(order.id)
             order.vendors.add(*vendors_ids)
             order.save()
+            for vendor_total in vendor_totals:
+                vendor_total.order = order
+            OrderVendorTotal.objects.bulk_create(vendor_totals)
 
             context = {
                 'order': order,
@@ -101,7 +108,7 @@ def place_order(request):
                             'product_data': {
                                 'name': item.fooditem.food_title,
                             },
-                            'unit_amount': int(item.fooditem.price * 100),  # Stripe uses smallest currency unit
+                            'unit_amount': to_minor_units(item.fooditem.price),  # Stripe uses smallest currency unit
                         },
                         'quantity': item.quantity,
                     })
@@ -114,25 +121,31 @@ def place_order(request):
                             'product_data': {
                                 'name': 'Tax',
                             },
-                            'unit_amount': int(total_tax * 100),
+                            'unit_amount': to_minor_units(total_tax),
                         },
                         'quantity': 1,
                     })
 
                 domain = get_current_site(request)
                 protocol = 'https' if request.is_secure() else 'http'
-                checkout_session = stripe.checkout.Session.create(
-                    payment_method_types=['card'],
-                    line_items=line_items,
-                    mode='payment',
-                    success_url=f'{protocol}://{domain}/orders/stripe_success/?order_no={order.order_number}&session_id={{CHECKOUT_SESSION_ID}}',
-                    cancel_url=f'{protocol}://{domain}/orders/stripe_cancel/?order_no={order.order_number}',
-                    metadata={
-                        'order_number': order.order_number,
-                    },
-                )
-                context['stripe_session_id'] = checkout_session.id
-                context['STRIPE_PUBLIC_KEY'] = settings.STRIPE_PUBLIC_KEY
+                try:
+                    checkout_session = stripe.checkout.Session.create(
+                        payment_method_types=['card'],
+                        line_items=line_items,
+                        mode='payment',
+                        success_url=f'{protocol}://{domain}/orders/stripe_success/?order_no={order.order_number}&session_id={{CHECKOUT_SESSION_ID}}',
+                        cancel_url=f'{protocol}://{domain}/orders/stripe_cancel/?order_no={order.order_number}',
+                        metadata={
+                            'order_number': order.order_number,
+                        },
+                    )
+                    context['stripe_session_id'] = checkout_session.id
+                    order.gateway_session_id = checkout_session.id
+                    order.save(update_fields=['gateway_session_id'])
+                    context['STRIPE_PUBLIC_KEY'] = settings.STRIPE_PUBLIC_KEY
+                except stripe.error.StripeError as e:
+                    logger.warning('Stripe checkout session for order %s failed: %s', order.order_number, e)
+                    context['payment_error'] = 'Payment gateway initialization failed. Please try again.'
 
             elif order.payment_method == 'SSLCommerz':
                 # SSLCommerz Payment
@@ -141,8 +154,6 @@ def place_order(request):
                 base_url = f'{protocol}://{domain}'
 
                 sslcz_data = {
-                    'store_id': settings.SSLCOMMERZ_STORE_ID,
-                    'store_passwd': settings.SSLCOMMERZ_STORE_PASSWORD,
                     'total_amount': str(order.total),
                     'currency': 'BDT',
                     'tran_id': order.order_number,
@@ -163,18 +174,16 @@ def place_order(request):
                     'product_profile': 'non-physical-goods',
                 }
 
-                if settings.SSLCOMMERZ_SANDBOX:
-                    sslcz_url = 'https://sandbox.sslcommerz.com/gwprocess/v4/api.php'
-                else:
-                    sslcz_url = 'https://securepay.sslcommerz.com/gwprocess/v4/api.php'
-
-                response = requests.post(sslcz_url, data=sslcz_data)
-                response_data = response.json()
+                try:
+                    response_data = sslcommerz.init_payment(sslcz_data)
+                except GatewayError as e:
+                    logger.warning('SSLCommerz session for order %s failed: %s', order.order_number, e)
+                    response_data = {}
 
                 if response_data.get('status') == 'SUCCESS':
                     return redirect(response_data['GatewayPageURL'])
                 else:
-                    context['sslcommerz_error'] = 'Payment gateway initialization failed. Please try again.'
+                    context['payment_error'] = 'Payment gateway initialization failed. Please try again.'
 
             return render(request, 'orders/place_order.html', context)
         else:
@@ -183,145 +192,57 @@ def place_order(request):
 
 
 @login_required(login_url='login')
-def payments(request):
-    # Check if the request is ajax or not
-    if request.headers.get('x-requested-with') == 'XMLHttpRequest' and request.method == 'POST':
-        # STORE THE PAYMENT DETAILS IN THE PAYMENT MODEL
-        order_number = request.POST.get('order_number')
-        transaction_id = request.POST.get('transaction_id')
-        payment_method = request.POST.get('payment_method')
-        status = request.POST.get('status')
-
-        order = Order.objects.get(user=request.user, order_number=order_number)
-        payment = Payment(
-            user=request.user,
-            transaction_id=transaction_id,
-            payment_method=payment_method,
-            amount=order.total,
-            status=status
-        )
-        payment.save()
-
-        # UPDATE THE ORDER MODEL
-        order.payment = payment
-        order.is_ordered = True
-        order.save()
-
-        # MOVE THE CART ITEMS TO ORDERED FOOD MODEL
-        cart_items = Cart.objects.filter(user=request.user)
-        for item in cart_items:
-            ordered_food = OrderedFood()
-            ordered_food.order = order
-            ordered_food.payment = payment
-            ordered_food.user = request.user
-            ordered_food.fooditem = item.fooditem
-            ordered_food.quantity = item.quantity
-            ordered_food.price = item.fooditem.price
-            ordered_food.amount = item.fooditem.price * item.quantity
-            ordered_food.save()
-
-        # SEND ORDER CONFIRMATION EMAIL TO THE CUSTOMER
-        mail_subject = 'Thank you for ordering with us.'
-        mail_template = 'orders/order_confirmation_email.html'
-
-        ordered_food = OrderedFood.objects.filter(order=order)
-        customer_subtotal = 0
-        for item in ordered_food:
-            customer_subtotal += (item.price * item.quantity)
-        tax_data = json.loads(order.tax_data)
-        context = {
-            'user': request.user,
-            'order': order,
-            'to_email': order.email,
-            'ordered_food': ordered_food,
-            'domain': get_current_site(request),
-            'customer_subtotal': customer_subtotal,
-            'tax_data': tax_data,
-        }
-        send_notification(mail_subject, mail_template, context)
-
-        # SEND ORDER RECEIVED EMAIL TO THE VENDOR
-        mail_subject = 'You have received a new order.'
-        mail_template = 'orders/new_order_received.html'
-        to_emails = []
-        for i in cart_items:
-            if i.fooditem.vendor.user.email not in to_emails:
-                to_emails.append(i.fooditem.vendor.user.email)
-
-                ordered_food_to_vendor = OrderedFood.objects.filter(order=order, fooditem__vendor=i.fooditem.vendor)
-
-                context = {
-                    'order': order,
-                    'to_email': i.fooditem.vendor.user.email,
-                    'ordered_food_to_vendor': ordered_food_to_vendor,
-                    'vendor_subtotal': order_total_by_vendor(order, i.fooditem.vendor.id)['subtotal'],
-                    'tax_data': order_total_by_vendor(order, i.fooditem.vendor.id)['tax_dict'],
-                    'vendor_grand_total': order_total_by_vendor(order, i.fooditem.vendor.id)['grand_total'],
-                }
-                send_notification(mail_subject, mail_template, context)
-
-        # CLEAR THE CART IF THE PAYMENT IS SUCCESS
-        # cart_items.delete()
-
-        # RETURN BACK TO AJAX WITH THE STATUS SUCCESS OR FAILURE
-        response = {
-            'order_number': order_number,
-            'transaction_id': transaction_id,
-        }
-        return JsonResponse(response)
-    return HttpResponse('Payments view')
+def stripe_success(request):
+    """
+    Stripe redirects here after payment. The order is confirmed by the
+    checkout.session.completed webhook, so this page only waits for the
+    order to be marked as ordered.
+    """
+    order_number = request.GET.get('order_no')
+    order = Order.objects.filter(order_number=order_number, user=request.user).select_related('payment').first()
+    if order is None:
+        return redirect('home')
+    if order.is_ordered:
+        return redirect(f'/orders/order_complete/?order_no={order_number}&trans_id={order.payment.transaction_id}')
+    return render(request, 'orders/payment_processing.html', {'order': order})
 
 
 @login_required(login_url='login')
-def stripe_success(request):
-    """Handle successful Stripe payment"""
-    order_number = request.GET.get('order_no')
-    session_id = request.GET.get('session_id')
+def order_status(request):
+    """Polled by the payment processing page"""
+    order = Order.objects.filter(order_number=request.GET.get('order_no'), user=request.user).select_related('payment').first()
+    if order is None:
+        return JsonResponse({'status': 'not_found'}, status=404)
+    response = {
+        'order_number': order.order_number,
+        'is_ordered': order.is_ordered,
+        'status': order.status,
+    }
+    if order.is_ordered:
+        response['redirect_url'] = f'/orders/order_complete/?order_no={order.order_number}&trans_id={order.payment.transaction_id}'
+    return JsonResponse(response)
 
-    try:
-        session = stripe.checkout.Session.retrieve(session_id)
-        if session.payment_status == 'paid':
-            order = Order.objects.get(order_number=order_number, user=request.user)
-
-            # Create payment record
-            payment = Payment(
-                user=request.user,
-                transaction_id=session.payment_intent,
-                payment_method='Stripe',
-                amount=order.total,
-                status='Completed'
-            )
-            payment.save()
-
-            # Update order
-            order.payment = payment
-            order.is_ordered = True
-            order.save()
 
-            # Move cart items to ordered food
-            cart_items = Cart.objects.filter(user=request.user)
-            for item in cart_items:
-                ordered_food = OrderedFood()
-                ordered_food.order = order
-                ordered_food.payment = payment
-                ordered_food.user = request.user
-                ordered_food.fooditem = item.fooditem
-                ordered_food.quantity = item.quantity
-                ordered_food.price = item.fooditem.price
-                ordered_food.amount = item.fooditem.price * item.quantity
-                ordered_food.save()
-
-            # Send emails
-            _send_order_emails(request, order, cart_items)
-
-            # Clear cart
-            cart_items.delete()
-
-            return redirect(f'/orders/order_complete/?order_no={order_number}&trans_id={session.payment_intent}')
-    except Exception as e:
-        print(e)
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    """Stripe webhook endpoint; the payload must be signed with STRIPE_WEBHOOK_SECRET"""
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        # Without a secret any payload would verify; Stripe retries the event later
+        logger.error('STRIPE_WEBHOOK_SECRET is not set, refusing the Stripe webhook')
+        return HttpResponse(status=503)
+    payload = request.body.decode('utf-8', errors='replace')
+    try:
+        stripe.WebhookSignature.verify_header(
+            payload, request.headers.get('Stripe-Signature', ''), settings.STRIPE_WEBHOOK_SECRET,
+            tolerance=stripe.Webhook.DEFAULT_TOLERANCE,
+        )
+        event = json.loads(payload)
+    except (ValueError, stripe.error.SignatureVerificationError):
+        return HttpResponse(status=400)
 
-    return redirect('home')
+    handle_stripe_event(event, domain=get_current_site(request))
+    return HttpResponse(status=200)
 
 
 @login_required(login_url='login')
@@ -337,8 +258,11 @@ def stripe_cancel(request):
     return redirect('checkout')
 
 
-@csrf_exempt
-def sslcommerz_success(request):
+# The SSLCommerz callbacks are async: while they wait on the gateway they hold
+# no worker thread, so under ASGI (the events service) thousands of them can
+# be in flight at once. Only the database work runs in a thread.
+
+async def sslcommerz_success(request):
     """Handle successful SSLCommerz payment"""
     if request.method == 'POST':
         data = request.POST
@@ -348,52 +272,20 @@ def sslcommerz_success(request):
 
         if status == 'VALID':
             # Validate the transaction with SSLCommerz
-            if _validate_sslcommerz(val_id):
+            if await _validate_sslcommerz(val_id, tran_id):
                 try:
-                    order = Order.objects.get(order_number=tran_id)
-                    user = order.user
-
-                    # Create payment record
-                    payment = Payment(
-                        user=user,
-                        transaction_id=val_id,
-                        payment_method='SSLCommerz',
-                        amount=order.total,
-                        status='Completed'
-                    )
-                    payment.save()
-
-                    # Update order
-                    order.payment = payment
-                    order.is_ordered = True
-                    order.save()
-
-                    # Move cart items to ordered food
-                    cart_items = Cart.objects.filter(user=user)
-                    for item in cart_items:
-                        ordered_food = OrderedFood()
-                        ordered_food.order = order
-                        ordered_food.payment = payment
-                        ordered_food.user = user
-                        ordered_food.fooditem = item.fooditem
-                        ordered_food.quantity = item.quantity
-                        ordered_food.price = item.fooditem.price
-                        ordered_food.amount = item.fooditem.price * item.quantity
-                        ordered_food.save()
-
-                    # Send emails
-                    _send_order_emails(request, order, cart_items)
-
-                    # Clear cart
-                    cart_items.delete()
-
-                    return redirect(f'/orders/order_complete/?order_no={tran_id}&trans_id={val_id}')
-                except Order.DoesNotExist:
+                    transaction_id = await sync_to_async(_finalize_callback)(request, tran_id, val_id, 'SSLCommerz')
+                    return redirect(f'/orders/order_complete/?order_no={tran_id}&trans_id={transaction_id}')
+                except (Order.DoesNotExist, FinalizeError):
                     pass
 
     return redirect('home')
 
 
+# csrf_exempt's wrapper is sync and would hide the coroutine from Django
+sslcommerz_success.csrf_exempt = True
+
+
 @csrf_exempt
 def sslcommerz_fail(request):
     """Handle failed SSLCommerz payment"""
@@ -422,8 +314,7 @@ def sslcommerz_cancel(request):
     return redirect('checkout')
 
 
-@csrf_exempt
-def sslcommerz_ipn(request):
+async def sslcommerz_ipn(request):
     """SSLCommerz Instant Payment Notification"""
     if request.method == 'POST':
         data = request.POST
@@ -432,85 +323,46 @@ def sslcommerz_ipn(request):
         status = data.get('status')
 
         if status == 'VALID':
-            if _validate_sslcommerz(val_id):
+            if await _validate_sslcommerz(val_id, tran_id):
                 try:
-                    order = Order.objects.get(order_number=tran_id)
-                    if not order.is_ordered:
-                        user = order.user
-                        payment = Payment(
-                            user=user,
-                            transaction_id=val_id,
-                            payment_method='SSLCommerz',
-                            amount=order.total,
-                            status='Completed'
-                        )
-                        payment.save()
-                        order.payment = payment
-                        order.is_ordered = True
-                        order.save()
-                except Order.DoesNotExist:
+                    await sync_to_async(_finalize_callback)(request, tran_id, val_id, 'SSLCommerz')
+                except (Order.DoesNotExist, FinalizeError):
                     pass
 
     return HttpResponse('IPN received')
 
 
-def _validate_sslcommerz(val_id):
-    """Validate SSLCommerz transaction"""
-    if settings.SSLCOMMERZ_SANDBOX:
-        validation_url = 'https://sandbox.sslcommerz.com/validator/api/validationserverAPI.php'
-    else:
-        validation_url = 'https://securepay.sslcommerz.com/validator/api/validationserverAPI.php'
+sslcommerz_ipn.csrf_exempt = True
 
-    params = {
-        'val_id': val_id,
-        'store_id': settings.SSLCOMMERZ_STORE_ID,
-        'store_passwd': settings.SSLCOMMERZ_STORE_PASSWORD,
-        'format': 'json',
-    }
-    response = requests.get(validation_url, params=params)
-    result = response.json()
-    return result.get('status') == 'VALID'
-
-
-def _send_order_emails(request, order, cart_items):
-    """Send order confirmation emails to customer and vendors"""
-    # SEND ORDER CONFIRMATION EMAIL TO THE CUSTOMER
-    mail_subject = 'Thank you for ordering with us.'
-    mail_template = 'orders/order_confirmation_email.html'
-
-    ordered_food = OrderedFood.objects.filter(order=order)
-    customer_subtotal = 0
-    for item in ordered_food:
-        customer_subtotal += (item.price * item.quantity)
-    tax_data = json.loads(order.tax_data)
-    context = {
-        'user': order.user,
-        'order': order,
-        'to_email': order.email,
-        'ordered_food': ordered_food,
-        'domain': get_current_site(request),
-        'customer_subtotal': customer_subtotal,
-        'tax_data': tax_data,
-    }
-    send_notification(mail_subject, mail_template, context)
 
-    # SEND ORDER RECEIVED EMAIL TO THE VENDOR
-    mail_subject = 'You have received a new order.'
-    mail_template = 'orders/new_order_received.html'
-    to_emails = []
-    for i in cart_items:
-        if i.fooditem.vendor.user.email not in to_emails:
-            to_emails.append(i.fooditem.vendor.user.email)
-            ordered_food_to_vendor = OrderedFood.objects.filter(order=order, fooditem__vendor=i.fooditem.vendor)
-            context = {
-                'order': order,
-                'to_email': i.fooditem.vendor.user.email,
-                'ordered_food_to_vendor': ordered_food_to_vendor,
-                'vendor_subtotal': order_total_by_vendor(order, i.fooditem.vendor.id)['subtotal'],
-                'tax_data': order_total_by_vendor(order, i.fooditem.vendor.id)['tax_dict'],
-                'vendor_grand_total': order_total_by_vendor(order, i.fooditem.vendor.id)['grand_total'],
-            }
-            send_notification(mail_subject, mail_template, context)
+async def _validate_sslcommerz(val_id, tran_id):
+    """
+    Validate SSLCommerz transaction: the gateway must report it valid, for
+    the order ``tran_id`` and for the order's total
+    """
+    try:
+        result = await sslcommerz.avalidate(val_id)
+    except GatewayError as e:
+        logger.warning('SSLCommerz validation of %s failed: %s', val_id, e)
+        return False
+    if result.get('status') not in ('VALID', 'VALIDATED') or result.get('tran_id') != tran_id:
+        logger.warning('SSLCommerz validation %s does not confirm order %s', val_id, tran_id)
+        return False
+    order = await sync_to_async(Order.objects.filter(order_number=tran_id).only('total').first)()
+    if order is None or not amount_matches(order, result.get('amount')):
+        logger.warning('SSLCommerz validation %s: amount %s does not match order %s', val_id, result.get('amount'), tran_id)
+        return False
+    return True
+
+
+def _finalize_callback(request, order_number, transaction_id, payment_method):
+    """Run finalize_order for a payment callback; returns the stored transaction id"""
+    try:
+        order, created = finalize_order(order_number, transaction_id, payment_method, domain=get_current_site(request))
+    except FinalizeError as e:
+        logger.error('%s callback for order %s refused: %s', payment_method, order_number, e)
+        raise
+    return order.payment.transaction_id
 
 
 def order_complete(request):
@@ -518,19 +370,14 @@ def order_complete(request):
     transaction_id = request.GET.get('trans_id')
 
     try:
-        order = Order.objects.get(order_number=order_number, payment__transaction_id=transaction_id, is_ordered=True)
-        ordered_food = OrderedFood.objects.filter(order=order)
-
-        subtotal = 0
-        for item in ordered_food:
-            subtotal += (item.price * item.quantity)
-
-        tax_data = json.loads(order.tax_data)
+        order = Order.objects.select_related('receipt').get(order_number=order_number, payment__transaction_id=transaction_id, is_ordered=True)
+        receipt = OrderReceipt.for_order(order)
         context = {
             'order': order,
-            'ordered_food': ordered_food,
-            'subtotal': subtotal,
-            'tax_data': tax_data,
+            'transaction_id': receipt.data['transaction_id'],
+            'ordered_food': receipt.data['items'],
+            'subtotal': receipt.data['subtotal'],
+            'tax_data': receipt.data['tax_data'],
         }
         return render(request, 'orders/order_complete.html', context)
     except:
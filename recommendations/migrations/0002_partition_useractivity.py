@@ -0,0 +1,25 @@
+# Generated by Django 4.0.3 on 2026-10-19 16:12
+
+from django.db import migrations
+
+from orders.partitions import convert_to_partitioned, convert_to_plain
+
+
+def partition_useractivity(apps, schema_editor):
+    convert_to_partitioned(schema_editor, 'recommendations_useractivity')
+
+
+def unpartition_useractivity(apps, schema_editor):
+    convert_to_plain(schema_editor, 'recommendations_useractivity')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0001_initial'),
+        ('orders', '0011_partition_orderedfood'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_useractivity, unpartition_useractivity),
+    ]
@@ -24,6 +24,7 @@ class Review(models.Model):
 
 
 class UserActivity(models.Model):
+    # Partitioned by month of created_at, see orders.partitions
     ACTIVITY_TYPES = (
         ('view', 'Viewed'),
         ('cart', 'Added to Cart'),
@@ -1,5 +1,6 @@
 from django import template
 from recommendations.engine import RecommendationEngine
+from vendor.schedule import set_open_status
 
 register = template.Library()
 
@@ -51,7 +52,7 @@ def vendor_recommendations(context, title='Recommended Restaurants'):
     vendors = []
 
     if user.is_authenticated:
-        vendors = RecommendationEngine.get_vendor_recommendations(user, limit=6)
+        vendors = set_open_status(RecommendationEngine.get_vendor_recommendations(user, limit=6).select_related('user_profile'))
 
     return {
         'recommended_vendors': vendors,